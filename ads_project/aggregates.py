@@ -0,0 +1,175 @@
+import math
+
+LABELS = ('Positive', 'Neutral', 'Negative')
+# Fixed-width score histogram over [-1, 1].
+HIST_BINS = 10
+_BIN = f'MIN(CAST((({{score}}) + 1) * {HIST_BINS / 2} AS INTEGER), {HIST_BINS - 1})'
+
+_STATS_COLUMNS = (
+    'slug, total, positive, neutral, negative, score_sum, score_sumsq, '
+    'min_score, min_review, max_score, max_review'
+)
+
+# Recompute a movie's row from reviews; used for the initial backfill and
+# when a review is deleted or changed (inserts are applied incrementally).
+_REBUILD_STATS = f"""
+    INSERT OR REPLACE INTO movie_stats ({_STATS_COLUMNS})
+    SELECT r.slug, COUNT(*), SUM(r.label = 'Positive'), SUM(r.label = 'Neutral'), SUM(r.label = 'Negative'),
+           SUM(r.score), SUM(r.score * r.score),
+           MIN(r.score), (SELECT x.review FROM reviews x WHERE x.slug = r.slug ORDER BY x.score ASC, x.rowid ASC LIMIT 1),
+           MAX(r.score), (SELECT x.review FROM reviews x WHERE x.slug = r.slug ORDER BY x.score DESC, x.rowid ASC LIMIT 1)
+    FROM reviews r {{where}} GROUP BY r.slug
+"""
+_REBUILD_HIST = f"""
+    INSERT OR REPLACE INTO movie_score_hist (slug, bin, count)
+    SELECT r.slug, {_BIN.format(score='r.score')}, COUNT(*) FROM reviews r {{where}} GROUP BY 1, 2
+"""
+
+
+def _rebuild_slug(slug_expr):
+    where = f'WHERE r.slug = {slug_expr}'
+    return (
+        f'DELETE FROM movie_stats WHERE slug = {slug_expr}; '
+        f'DELETE FROM movie_score_hist WHERE slug = {slug_expr}; '
+        f'{_REBUILD_STATS.format(where=where)}; '
+        f'{_REBUILD_HIST.format(where=where)};'
+    )
+
+
+def init_aggregates(conn):
+    """Per-movie sentiment aggregates, maintained by triggers on reviews.
+
+    Each stored review adds to its movie's label counts, score sum and sum of
+    squares, min/max score (keeping the first review that reached it) and
+    histogram bin, so summaries are a single-row read however many reviews
+    a movie has.
+    """
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'movie_stats'").fetchone()
+    if exists:
+        _init_delete_trigger(conn)
+        return
+    with conn:
+        conn.execute(
+            """
+            CREATE TABLE movie_stats (
+                slug TEXT PRIMARY KEY,
+                total INTEGER NOT NULL,
+                positive INTEGER NOT NULL,
+                neutral INTEGER NOT NULL,
+                negative INTEGER NOT NULL,
+                score_sum REAL NOT NULL,
+                score_sumsq REAL NOT NULL,
+                min_score REAL NOT NULL,
+                min_review TEXT NOT NULL,
+                max_score REAL NOT NULL,
+                max_review TEXT NOT NULL
+            )
+            """
+        )
+        conn.execute(
+            """
+            CREATE TABLE movie_score_hist (
+                slug TEXT NOT NULL,
+                bin INTEGER NOT NULL,
+                count INTEGER NOT NULL,
+                PRIMARY KEY (slug, bin)
+            ) WITHOUT ROWID
+            """
+        )
+        conn.execute(
+            f"""
+            CREATE TRIGGER IF NOT EXISTS movie_stats_insert AFTER INSERT ON reviews BEGIN
+                INSERT INTO movie_stats ({_STATS_COLUMNS})
+                VALUES (new.slug, 1, new.label = 'Positive', new.label = 'Neutral', new.label = 'Negative',
+                        new.score, new.score * new.score, new.score, new.review, new.score, new.review)
+                ON CONFLICT(slug) DO UPDATE SET
+                    total = total + 1,
+                    positive = positive + excluded.positive,
+                    neutral = neutral + excluded.neutral,
+                    negative = negative + excluded.negative,
+                    score_sum = score_sum + excluded.score_sum,
+                    score_sumsq = score_sumsq + excluded.score_sumsq,
+                    min_review = CASE WHEN excluded.min_score < min_score THEN excluded.min_review ELSE min_review END,
+                    min_score = MIN(min_score, excluded.min_score),
+                    max_review = CASE WHEN excluded.max_score > max_score THEN excluded.max_review ELSE max_review END,
+                    max_score = MAX(max_score, excluded.max_score);
+                INSERT INTO movie_score_hist (slug, bin, count)
+                VALUES (new.slug, {_BIN.format(score='new.score')}, 1)
+                ON CONFLICT(slug, bin) DO UPDATE SET count = count + 1;
+            END
+            """
+        )
+        conn.execute(
+            f'CREATE TRIGGER IF NOT EXISTS movie_stats_update AFTER UPDATE ON reviews BEGIN '
+            f'{_rebuild_slug("old.slug")} {_rebuild_slug("new.slug")} END'
+        )
+        # Reviews stored before the aggregates existed.
+        conn.execute(_REBUILD_STATS.format(where=''))
+        conn.execute(_REBUILD_HIST.format(where=''))
+    _init_delete_trigger(conn)
+
+
+# A deleted review rebuilds its movie's row, unless that row is already gone:
+# remove_movie_stats drops it first so deleting all of a movie's reviews does
+# not rebuild once per review.
+_DELETE_TRIGGER = (
+    f'CREATE TRIGGER movie_stats_delete AFTER DELETE ON reviews '
+    f'WHEN EXISTS (SELECT 1 FROM movie_stats WHERE slug = old.slug) BEGIN '
+    f'{_rebuild_slug("old.slug")} END'
+)
+
+
+def _init_delete_trigger(conn):
+    # Also replaces the unconditional trigger of databases created before.
+    row = conn.execute("SELECT sql FROM sqlite_master WHERE type = 'trigger' AND name = 'movie_stats_delete'").fetchone()
+    if row is None or row[0] != _DELETE_TRIGGER:
+        with conn:
+            conn.execute('DROP TRIGGER IF EXISTS movie_stats_delete')
+            conn.execute(_DELETE_TRIGGER)
+
+
+def remove_movie_stats(conn, slug):
+    """Drop slug's aggregates ahead of deleting all of its reviews (in the same transaction)."""
+    conn.execute('DELETE FROM movie_stats WHERE slug = ?', (slug,))
+    conn.execute('DELETE FROM movie_score_hist WHERE slug = ?', (slug,))
+
+
+def _summary(row, hist):
+    total = row['total']
+    mean = row['score_sum'] / total
+    variance = max(row['score_sumsq'] / total - mean * mean, 0.0)
+    counts = {'Positive': row['positive'], 'Neutral': row['neutral'], 'Negative': row['negative']}
+    bins = [0] * HIST_BINS
+    for b, c in hist:
+        bins[b] = c
+    return {
+        'slug': row['slug'],
+        'total': total,
+        # Non-zero label counts, most frequent first.
+        'labels': {k: v for k, v in sorted(counts.items(), key=lambda kv: kv[1], reverse=True) if v},
+        'mean': mean,
+        'stddev': math.sqrt(variance),
+        'min_score': row['min_score'],
+        'min_review': row['min_review'],
+        'max_score': row['max_score'],
+        'max_review': row['max_review'],
+        'histogram': bins,
+    }
+
+
+def movie_summaries(conn, slugs):
+    """{slug: summary} for the given slugs that have stored reviews."""
+    slugs = list(dict.fromkeys(slugs))
+    if not slugs:
+        return {}
+    marks = ', '.join('?' * len(slugs))
+    hist = {}
+    for r in conn.execute(f'SELECT slug, bin, count FROM movie_score_hist WHERE slug IN ({marks})', slugs):
+        hist.setdefault(r['slug'], []).append((r['bin'], r['count']))
+    rows = conn.execute(f'SELECT * FROM movie_stats WHERE slug IN ({marks})', slugs)
+    return {r['slug']: _summary(r, hist.get(r['slug'], ())) for r in rows}
+
+
+def movie_summary(conn, slug):
+    """Aggregates for one movie, or None if nothing is stored for it."""
+    return movie_summaries(conn, [slug]).get(slug)
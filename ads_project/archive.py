@@ -0,0 +1,108 @@
+"""Record/replay archive of scraped pages.
+
+In record mode every page the scraper fetches (HTTP listing pages and the
+final page_source of browser scrapes) is stored, zlib-compressed, in a
+SQLite file keyed by URL. In replay mode get_reviews is served entirely
+from that file: no network, no Chrome, and the same reviews every run.
+
+Set SCRAPER_ARCHIVE_MODE=record|replay (and SCRAPER_ARCHIVE to the file),
+or call configure(); export_powerbi.py and main.py take --record/--replay.
+"""
+import os
+import threading
+import time
+import zlib
+
+from db import connect
+
+MODES = ('record', 'replay')
+ARCHIVE_PATH = os.environ.get('SCRAPER_ARCHIVE', os.path.join(os.path.dirname(__file__), 'data', 'scrape_archive.db'))
+
+# Unset or empty means live scraping; anything else must be exactly a mode,
+# so a typo fails at startup instead of silently scraping live.
+_mode = os.environ.get('SCRAPER_ARCHIVE_MODE', '') or None
+if _mode not in MODES + (None,):
+    raise ValueError(f'SCRAPER_ARCHIVE_MODE must be one of {", ".join(MODES)} (got {_mode!r})')
+_path = ARCHIVE_PATH
+_archive = None
+_archive_lock = threading.Lock()
+
+
+class PageArchive:
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS pages (
+                    url TEXT NOT NULL,
+                    source TEXT NOT NULL,
+                    status INTEGER NOT NULL,
+                    fetched_at REAL NOT NULL,
+                    body BLOB NOT NULL,
+                    PRIMARY KEY (url, source)
+                )
+                """
+            )
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = connect(self.path)
+        return conn
+
+    def put(self, url, body, status=200, source='http'):
+        """Store (or replace) the page fetched from url; source is 'http' or 'browser'."""
+        data = zlib.compress((body or '').encode('utf-8'), 6)
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO pages (url, source, status, fetched_at, body) VALUES (?, ?, ?, ?, ?)',
+                (url, source, int(status), time.time(), data),
+            )
+
+    def get(self, url, source='http'):
+        """(status, body) recorded for url, or None."""
+        row = self._conn().execute('SELECT status, body FROM pages WHERE url = ? AND source = ?', (url, source)).fetchone()
+        if row is None:
+            return None
+        return row['status'], zlib.decompress(row['body']).decode('utf-8')
+
+    def urls(self, source=None):
+        sql, params = 'SELECT url FROM pages', ()
+        if source:
+            sql, params = sql + ' WHERE source = ?', (source,)
+        return [r['url'] for r in self._conn().execute(sql + ' ORDER BY url', params)]
+
+
+def configure(mode, path=None):
+    """Switch this process to 'record', 'replay' or (None) live scraping."""
+    global _mode, _path, _archive
+    if mode not in MODES + (None,):
+        raise ValueError(f'archive mode must be one of {", ".join(MODES)} (got {mode!r})')
+    if mode == 'replay' and not os.path.exists(path or ARCHIVE_PATH):
+        raise FileNotFoundError(f'no scrape archive at {path or ARCHIVE_PATH}')
+    with _archive_lock:
+        _mode = mode
+        _path = path or ARCHIVE_PATH
+        _archive = None
+
+
+def recording():
+    return _mode == 'record'
+
+
+def replaying():
+    return _mode == 'replay'
+
+
+def current():
+    """The configured PageArchive, opened on first use."""
+    global _archive
+    with _archive_lock:
+        if _archive is None:
+            _archive = PageArchive(_path)
+        return _archive
@@ -0,0 +1,210 @@
+"""Benchmark cases. Each one returns {metric name: (value, unit, better)}.
+
+Everything runs offline against data/ in this repo: scraping is stubbed
+with reviews from data/*_reviews.csv and databases/exports go to a temp dir.
+"""
+import csv
+import glob
+import os
+import random
+import re
+import statistics
+import tempfile
+import time
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.path.join(APP_DIR, 'data')
+
+HIGHER = 'higher'
+LOWER = 'lower'
+
+
+def timed(fn, repeat):
+    """Median and best wall time of fn() over `repeat` runs, after one warm-up."""
+    fn()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples), min(samples)
+
+
+def sample_reviews():
+    """{slug: [review, ...]} from data/*_reviews.csv."""
+    out = {}
+    for path in sorted(glob.glob(os.path.join(DATA_DIR, '*_reviews.csv'))):
+        slug = os.path.basename(path)[:-len('_reviews.csv')]
+        with open(path, 'r', encoding='utf-8', newline='') as f:
+            out[slug] = [row['Review'] for row in csv.DictReader(f)]
+    return out
+
+
+def synth_corpus(size, seed=0):
+    """`size` reviews stitched from sentences of the sample reviews (deterministic)."""
+    sentences = []
+    for texts in sample_reviews().values():
+        for text in texts:
+            sentences.extend(s.strip() for s in re.split(r'(?<=[.!?])\s+', text) if s.strip())
+    rng = random.Random(seed)
+    return [' '.join(rng.choice(sentences) for _ in range(rng.randint(1, 6))) for _ in range(size)]
+
+
+def fake_get_reviews(corpus):
+    """get_reviews stand-in serving `max_reviews` corpus reviews per slug."""
+    def get_reviews(slug, max_reviews=10, stop_at=None, **kw):
+        rng = random.Random(slug)
+        out = []
+        for text in rng.sample(corpus, min(max_reviews, len(corpus))):
+            if stop_at and stop_at(text):
+                break
+            out.append(text)
+        return out
+    return get_reviews
+
+
+# --- Cases ---
+
+def bench_extract(repeat):
+    from review_extract import extract_review_texts
+
+    with open(os.path.join(DATA_DIR, 'last_page.html'), 'r', encoding='utf-8') as f:
+        html = f.read()
+    pages = 20
+    median, _ = timed(lambda: [extract_review_texts(html) for _ in range(pages)], repeat)
+    return {
+        'extract.pages_per_s': (pages / median, 'pages/s', HIGHER),
+        'extract.reviews_per_page': (len(extract_review_texts(html)), 'reviews', None),
+    }
+
+
+def bench_sentiment(repeat):
+    from nltk.sentiment.vader import SentimentIntensityAnalyzer
+    from sentiment import _preprocess, analyze_sentiment, analyze_sentiment_batch, get_analyzer
+
+    # Distinct reviews only, so the batch memo does not flatter the numbers.
+    corpus = list(dict.fromkeys(synth_corpus(2000)))
+    analyzer = get_analyzer()
+    stock, _ = timed(lambda: [SentimentIntensityAnalyzer.polarity_scores(analyzer, _preprocess(t)) for t in corpus], repeat)
+    single, _ = timed(lambda: [analyze_sentiment(t) for t in corpus], repeat)
+    batch, _ = timed(lambda: analyze_sentiment_batch(corpus), repeat)
+    return {
+        'sentiment.stock_reviews_per_s': (len(corpus) / stock, 'reviews/s', None),
+        'sentiment.single_reviews_per_s': (len(corpus) / single, 'reviews/s', HIGHER),
+        'sentiment.batch_reviews_per_s': (len(corpus) / batch, 'reviews/s', HIGHER),
+        'sentiment.batch_speedup_vs_stock': (stock / batch, 'x', HIGHER),
+    }
+
+
+def bench_export(repeat):
+    import export_powerbi
+
+    corpus = synth_corpus(1500, seed=1)
+    movies = [f'Bench Movie {i}' for i in range(12)]
+    export_powerbi.get_reviews = fake_get_reviews(corpus)
+    tmp = tempfile.mkdtemp(prefix='bench-export-')
+    runs = iter(range(repeat + 1))
+
+    def run():
+        # A fresh store and output dir per run, so every run does the same work.
+        n = next(runs)
+        export_powerbi.export_powerbi(
+            movies, max_reviews=50, out_dir=os.path.join(tmp, f'out{n}'),
+            db_path=os.path.join(tmp, f'store{n}.db'), processes=0,
+        )
+
+    median, _ = timed(run, repeat)
+    return {
+        'export.seconds': (median, 's', LOWER),
+        'export.movies_per_s': (len(movies) / median, 'movies/s', HIGHER),
+    }
+
+
+def _latencies(fn, repeat, calls):
+    fn()
+    samples = []
+    for _ in range(repeat * calls):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.95) - 1]
+
+
+def bench_server(repeat):
+    import db
+    import store
+    import server
+
+    db.DB_PATH = os.path.join(tempfile.mkdtemp(prefix='bench-server-'), 'app.db')
+    fetch = fake_get_reviews(synth_corpus(500, seed=2))
+    server.refresh_reviews = lambda slug, n: store.refresh_reviews(slug, n, fetch_fn=fetch)
+    server.init_db()
+    client = server.app.test_client()
+    client.post('/login', data={'username': 'demo', 'password': 'demo123'})
+
+    def dashboard():
+        r = client.post('/dashboard', data={'movie': 'Bench Movie', 'max_reviews': '20'})
+        assert r.status_code == 200
+
+    def compare():
+        r = client.post('/compare', data={'movie': ['Bench A', 'Bench B', 'Bench C'], 'max_reviews': '20'})
+        assert r.status_code == 200
+
+    def cold(view):
+        # Skip the in-process review cache: the request reads the store.
+        def run():
+            server.CACHE.invalidate()
+            view()
+        return run
+
+    results = {}
+    for name, fn in (('dashboard', dashboard), ('compare', compare)):
+        for mode, view in (('warm', fn), ('store', cold(fn))):
+            median, p95 = _latencies(view, repeat, calls=20)
+            results[f'server.{name}_{mode}_median_ms'] = (median, 'ms', LOWER)
+            results[f'server.{name}_{mode}_p95_ms'] = (p95, 'ms', LOWER)
+    return results
+
+
+def bench_replay(repeat):
+    # Real captured pages: only runs when a scrape archive has been recorded
+    # (python export_powerbi.py --record ...); BENCH_ARCHIVE picks another file.
+    import archive
+    import scraper
+
+    path = os.environ.get('BENCH_ARCHIVE', archive.ARCHIVE_PATH)
+    if not os.path.exists(path):
+        return {}
+    archive.configure('replay', path)
+    # (base URL, slug) of every recorded movie; the base is whatever host was
+    # scraped (letterboxd.com or a stub server).
+    found = {m.groups() for m in map(re.compile(r'^(.*)/film/([^/]+)/reviews/').match, archive.current().urls()) if m}
+    count = [0]
+
+    def run():
+        total = 0
+        for base, slug in sorted(found):
+            scraper.BASE_URL = base
+            total += len(scraper.get_reviews(slug, max_reviews=100))
+        count[0] = total
+
+    base_url = scraper.BASE_URL
+    try:
+        median, _ = timed(run, repeat)
+    finally:
+        scraper.BASE_URL = base_url
+        archive.configure(None)
+    return {
+        'replay.movies': (len(found), 'movies', None),
+        'replay.reviews_per_s': (count[0] / median, 'reviews/s', HIGHER),
+    }
+
+
+CASES = {
+    'extract': bench_extract,
+    'sentiment': bench_sentiment,
+    'export': bench_export,
+    'server': bench_server,
+    'replay': bench_replay,
+}
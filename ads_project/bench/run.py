@@ -0,0 +1,131 @@
+"""Offline benchmark suite.
+
+    python bench/run.py                          # all cases, JSON to stdout
+    python bench/run.py --only extract sentiment --output bench.json
+    python bench/run.py --output new.json --compare baseline.json
+
+With --compare the run is checked against a saved result file and the exit
+status is 1 if any metric got worse by more than --threshold (default 10%).
+--input reads an existing result file instead of running the suite.
+"""
+import argparse
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cases import APP_DIR, CASES, HIGHER, LOWER  # noqa: E402
+
+
+def _offline():
+    # Any attempt to reach the network is a bug in a case's stubbing.
+    def refuse(*args, **kwargs):
+        raise RuntimeError('benchmarks must run offline')
+    socket.socket.connect = refuse
+    socket.create_connection = refuse
+
+
+def _git_rev():
+    try:
+        out = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=APP_DIR, capture_output=True, text=True)
+        return out.stdout.strip() or None
+    except OSError:
+        return None
+
+
+def run_suite(names, repeat):
+    _offline()
+    metrics = {}
+    for name in names:
+        print(f'running {name}...', file=sys.stderr)
+        for metric, (value, unit, better) in CASES[name](repeat).items():
+            metrics[metric] = {'value': value, 'unit': unit, 'better': better}
+    return {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            'git': _git_rev(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'repeat': repeat,
+        },
+        'metrics': metrics,
+    }
+
+
+def compare(current, baseline, threshold):
+    """[(metric, baseline value, current value, relative change, status)].
+
+    The change is signed so that positive always means better.
+    """
+    rows = []
+    for metric, cur in current['metrics'].items():
+        base = baseline['metrics'].get(metric)
+        if base is None or cur['better'] not in (HIGHER, LOWER) or not base['value']:
+            rows.append((metric, base['value'] if base else None, cur['value'], None, 'new' if base is None else 'info'))
+            continue
+        change = (cur['value'] - base['value']) / base['value']
+        if cur['better'] == LOWER:
+            change = -change
+        status = 'REGRESSION' if change < -threshold else ('improved' if change > threshold else 'ok')
+        rows.append((metric, base['value'], cur['value'], change, status))
+    return rows
+
+
+def _fmt(value):
+    return '-' if value is None else f'{value:.4g}'
+
+
+def print_table(rows, out=sys.stderr):
+    width = max(len(r[0]) for r in rows)
+    print(f'{"metric":<{width}}  {"baseline":>10}  {"current":>10}  {"change":>8}  status', file=out)
+    for metric, base, cur, change, status in rows:
+        pct = '-' if change is None else f'{change:+.1%}'
+        print(f'{metric:<{width}}  {_fmt(base):>10}  {_fmt(cur):>10}  {pct:>8}  {status}', file=out)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run the offline benchmark suite')
+    parser.add_argument('--only', nargs='+', choices=sorted(CASES), help='Cases to run (default: all)')
+    parser.add_argument('--repeat', type=int, default=5, help='Timed runs per measurement (median is reported)')
+    parser.add_argument('--output', help='Write results JSON here instead of stdout')
+    parser.add_argument('--compare', metavar='BASELINE', help='Flag regressions against a saved results JSON')
+    parser.add_argument('--input', help='Compare this results JSON instead of running the suite')
+    parser.add_argument('--threshold', type=float, default=0.10, help='Relative slowdown counted as a regression')
+    args = parser.parse_args(argv)
+
+    if args.input:
+        with open(args.input, 'r', encoding='utf-8') as f:
+            results = json.load(f)
+    else:
+        results = run_suite(args.only or list(CASES), max(1, args.repeat))
+        text = json.dumps(results, indent=2, sort_keys=True)
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                f.write(text + '\n')
+        elif not args.compare:
+            print(text)
+
+    if not args.compare:
+        width = max((len(m) for m in results['metrics']), default=0)
+        for metric, v in results['metrics'].items():
+            print(f'{metric:<{width}}  {_fmt(v["value"]):>10}  {v["unit"]}', file=sys.stderr)
+        return 0
+    with open(args.compare, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    rows = compare(results, baseline, args.threshold)
+    print_table(rows)
+    regressions = [r[0] for r in rows if r[4] == 'REGRESSION']
+    if regressions:
+        print(f'{len(regressions)} regression(s) beyond {args.threshold:.0%}: {", ".join(regressions)}', file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
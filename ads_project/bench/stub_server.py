@@ -0,0 +1,84 @@
+"""Local stand-in for letterboxd.com that can inject throttling.
+
+    python bench/stub_server.py --port 8099 --throttle-every 3 --retry-after 1
+    LETTERBOXD_URL=http://127.0.0.1:8099 python main.py --movie "Barbie"
+
+Every review listing page (/film/<slug>/reviews/[page/N/]) is served from
+data/last_page.html, up to --pages pages. --throttle-every N answers every
+Nth request with 429 (and Retry-After), and --outage S answers 503 to
+everything for the first S seconds.
+"""
+import argparse
+import os
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_PAGE_RE = re.compile(r'^/film/[^/]+/reviews/(?:by/added/)?(?:page/(\d+)/)?$')
+
+
+def make_server(port=0, pages=3, throttle_every=0, retry_after=None, outage=0.0, html=None):
+    """A ThreadingHTTPServer (not yet serving); server.requests counts hits by status."""
+    if html is None:
+        with open(os.path.join(APP_DIR, 'data', 'last_page.html'), 'r', encoding='utf-8') as f:
+            html = f.read()
+    body = html.encode('utf-8')
+    started = time.monotonic()
+    lock = threading.Lock()
+    seen = [0]
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            with lock:
+                seen[0] += 1
+                n = seen[0]
+            match = _PAGE_RE.match(self.path)
+            if time.monotonic() - started < outage:
+                status = 503
+            elif throttle_every and n % throttle_every == 0:
+                status = 429
+            elif not match or int(match.group(1) or 1) > pages:
+                status = 404
+            else:
+                status = 200
+            with lock:
+                server.requests[status] = server.requests.get(status, 0) + 1
+            self.send_response(status)
+            if status in (429, 503) and retry_after is not None:
+                self.send_header('Retry-After', str(retry_after))
+            payload = body if status == 200 else b''
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+    server.requests = {}
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Serve stub Letterboxd review pages')
+    parser.add_argument('--port', type=int, default=8099)
+    parser.add_argument('--pages', type=int, default=3, help='Listing pages per movie')
+    parser.add_argument('--throttle-every', type=int, default=0, help='Answer every Nth request with 429')
+    parser.add_argument('--retry-after', type=int, default=None, help='Retry-After seconds sent with 429/503')
+    parser.add_argument('--outage', type=float, default=0.0, help='Answer 503 for this many seconds after start')
+    args = parser.parse_args(argv)
+    server = make_server(args.port, args.pages, args.throttle_every, args.retry_after, args.outage)
+    print(f'Serving on http://127.0.0.1:{server.server_address[1]}', file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    print(f'requests by status: {server.requests}', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,215 @@
+import atexit
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# selenium and webdriver_manager are imported inside the functions that need
+# them so importing the scraper (and the web app) does not pay for them.
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+
+_driver_path = None
+_driver_path_lock = threading.Lock()
+
+
+def chromedriver_path():
+    # ChromeDriverManager().install() hits the network and the disk; do it once per process.
+    global _driver_path
+    with _driver_path_lock:
+        if _driver_path is None:
+            from webdriver_manager.chrome import ChromeDriverManager
+            _driver_path = ChromeDriverManager().install()
+        return _driver_path
+
+
+def chrome_options():
+    from selenium.webdriver.chrome.options import Options
+
+    options = Options()
+    options.add_argument("--headless=new")
+    options.add_argument("--disable-gpu")
+    options.add_argument("--window-size=1920,1080")
+    options.add_argument("--disable-blink-features=AutomationControlled")
+    options.add_argument(f"user-agent={USER_AGENT}")
+    options.add_experimental_option("excludeSwitches", ["enable-automation"])
+    options.add_experimental_option('useAutomationExtension', False)
+    try:
+        options.add_experimental_option("prefs", {
+            "profile.managed_default_content_settings.images": 2
+        })
+    except Exception:
+        pass
+    try:
+        options.page_load_strategy = 'eager'
+    except Exception:
+        pass
+    return options
+
+
+# Requests the scraper never needs: stylesheets, fonts, media and third-party
+# trackers/ads. Blocked through the DevTools protocol for every page the
+# driver loads; images are already disabled via the content-settings pref.
+BLOCKED_URL_PATTERNS = [
+    "*.css", "*.css?*",
+    "*.woff", "*.woff2", "*.ttf", "*.otf", "*.eot",
+    "*.mp4", "*.webm", "*.m3u8", "*.mp3",
+    "*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.svg", "*.ico",
+    "*googletagmanager.com*", "*google-analytics.com*", "*doubleclick.net*",
+    "*googlesyndication.com*", "*adservice.google.*", "*amazon-adsystem.com*",
+    "*facebook.net*", "*scorecardresearch.com*", "*quantserve.com*",
+    "*pubmatic.com*", "*adnxs.com*", "*cookielaw.org*", "*onetrust.com*",
+]
+
+
+def block_resources(driver, patterns=BLOCKED_URL_PATTERNS):
+    try:
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": list(patterns)})
+    except Exception:
+        pass
+
+
+def new_chrome():
+    from selenium import webdriver
+    from selenium.webdriver.chrome.service import Service
+
+    service = Service(chromedriver_path())
+    driver = webdriver.Chrome(service=service, options=chrome_options())
+    block_resources(driver)
+    return driver
+
+
+def _quit(driver):
+    try:
+        driver.quit()
+    except Exception:
+        pass
+
+
+# Empties the page's web storage and returns its origin ("null" on about:blank).
+_CLEAR_PAGE_JS = """
+try { window.localStorage.clear(); window.sessionStorage.clear(); } catch (e) {}
+return window.location.origin;
+"""
+
+
+def reset_driver(driver):
+    """Bring a used driver back to a clean single blank tab with no site data.
+
+    Cookies are cleared for every domain (delete_all_cookies only reaches the
+    current one). Web storage is cleared in every open tab. Chrome then drops
+    all stored data (localStorage, IndexedDB, caches, ...) for those tabs'
+    origins. The kept tab's sessionStorage would otherwise survive the trip
+    to about:blank and back.
+
+    Raises if the browser is no longer responsive, so callers can discard it.
+    """
+    handles = driver.window_handles
+    origins = set()
+    for handle in reversed(handles):
+        driver.switch_to.window(handle)
+        origins.add(driver.execute_script(_CLEAR_PAGE_JS))
+        if handle != handles[0]:
+            driver.close()
+    # The loop ends on the first tab, which is the one kept.
+    driver.execute_cdp_cmd("Network.clearBrowserCookies", {})
+    for origin in origins - {None, "null"}:
+        driver.execute_cdp_cmd("Storage.clearDataForOrigin", {"origin": origin, "storageTypes": "all"})
+    driver.get("about:blank")
+
+
+class DriverPool:
+    """A bounded pool of warm headless Chrome instances.
+
+    At most `size` drivers exist at once; callers beyond that block in
+    acquire(). Drivers are reset on release and quit if the reset fails
+    (crashed browser) or if they sit idle longer than `idle_timeout`.
+    """
+
+    def __init__(self, size=2, idle_timeout=300, factory=new_chrome, reset=reset_driver):
+        self.size = size
+        self.idle_timeout = idle_timeout
+        self.factory = factory
+        self.reset = reset
+        self._slots = threading.BoundedSemaphore(size)
+        self._idle = []  # (driver, last_used), most recently used last
+        self._lock = threading.Lock()
+        self._reaper = None
+        self._closed = False
+
+    def acquire(self, timeout=None):
+        if not self._slots.acquire(timeout=timeout):
+            raise TimeoutError("no browser available in the pool")
+        self.reap()
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()[0]
+        try:
+            driver = self.factory()
+        except Exception:
+            self._slots.release()
+            raise
+        self._start_reaper()
+        return driver
+
+    def release(self, driver):
+        try:
+            self.reset(driver)
+        except Exception:
+            _quit(driver)
+        else:
+            with self._lock:
+                if self._closed:
+                    _quit(driver)
+                else:
+                    self._idle.append((driver, time.monotonic()))
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def driver(self, timeout=None):
+        drv = self.acquire(timeout=timeout)
+        try:
+            yield drv
+        finally:
+            self.release(drv)
+
+    def reap(self):
+        cutoff = time.monotonic() - self.idle_timeout
+        with self._lock:
+            stale = [d for d, ts in self._idle if ts < cutoff]
+            self._idle = [(d, ts) for d, ts in self._idle if ts >= cutoff]
+        for d in stale:
+            _quit(d)
+        return len(stale)
+
+    def _start_reaper(self):
+        with self._lock:
+            if self._reaper is not None:
+                return
+            self._reaper = threading.Thread(target=self._reap_loop, name="driver-pool-reaper", daemon=True)
+            self._reaper.start()
+
+    def _reap_loop(self):
+        while not self._closed:
+            time.sleep(max(1, self.idle_timeout / 2))
+            self.reap()
+
+    def idle_count(self):
+        with self._lock:
+            return len(self._idle)
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for d, _ in idle:
+            _quit(d)
+
+
+DRIVER_POOL = DriverPool(
+    size=int(os.environ.get('CHROME_POOL_SIZE', '2')),
+    idle_timeout=int(os.environ.get('CHROME_IDLE_TIMEOUT', '300')),
+)
+atexit.register(DRIVER_POOL.close)
@@ -0,0 +1,267 @@
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from db import connect
+
+
+class MemoryBackend:
+    """Per-process storage for ReviewCache (an LRU-ordered dict)."""
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, slug):
+        with self._lock:
+            entry = self._entries.get(slug)
+            if entry is not None:
+                self._entries.move_to_end(slug)
+            return entry
+
+    def put(self, slug, entry, maxsize):
+        """Store entry and evict least recently used slugs; returns the eviction count."""
+        evicted = 0
+        with self._lock:
+            self._entries[slug] = entry
+            self._entries.move_to_end(slug)
+            while len(self._entries) > maxsize:
+                self._entries.popitem(last=False)
+                evicted += 1
+        return evicted
+
+    def delete(self, slug=None):
+        with self._lock:
+            if slug is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(slug, None)
+
+    def size(self):
+        with self._lock:
+            return len(self._entries)
+
+    def acquire(self, slug, timeout):
+        # Single process: ReviewCache's in-flight events already serialize fetches.
+        return None
+
+    def release(self, slug, token):
+        pass
+
+
+class SQLiteBackend:
+    """ReviewCache storage shared by every worker process on the host.
+
+    Entries live in a SQLite file (WAL mode, so readers never block). Writes
+    are single transactions, and a lease row per slug acts as a cross-process
+    lock so only one worker scrapes a given movie at a time. A lease that is
+    not released (crashed worker) expires after `lease` seconds. Hits refresh
+    last_access (the LRU order) at most once per `touch_interval` seconds,
+    so most reads do not write.
+    """
+
+    def __init__(self, path, lease=60, poll=0.05, touch_interval=30):
+        self.path = path
+        self.lease = lease
+        self.poll = poll
+        self.touch_interval = touch_interval
+        self._local = threading.local()
+        self._init()
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = connect(self.path)
+        return conn
+
+    def _init(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS review_cache (
+                    slug TEXT PRIMARY KEY,
+                    ts REAL NOT NULL,
+                    max_reviews INTEGER NOT NULL,
+                    data TEXT NOT NULL,
+                    last_access REAL NOT NULL
+                )
+                """
+            )
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS review_cache_locks (
+                    slug TEXT PRIMARY KEY,
+                    token TEXT NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+                """
+            )
+
+    def get(self, slug):
+        conn = self._conn()
+        row = conn.execute(
+            'SELECT ts, max_reviews, data, last_access FROM review_cache WHERE slug = ?', (slug,)
+        ).fetchone()
+        if row is None:
+            return None
+        now = time.time()
+        if now - row['last_access'] >= self.touch_interval:
+            with conn:
+                conn.execute('UPDATE review_cache SET last_access = ? WHERE slug = ?', (now, slug))
+        return {'ts': row['ts'], 'max_reviews': row['max_reviews'], 'data': json.loads(row['data'])}
+
+    def put(self, slug, entry, maxsize):
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO review_cache (slug, ts, max_reviews, data, last_access) VALUES (?, ?, ?, ?, ?)',
+                (slug, entry['ts'], entry['max_reviews'], json.dumps(entry['data']), time.time()),
+            )
+            cur = conn.execute(
+                'DELETE FROM review_cache WHERE slug IN '
+                '(SELECT slug FROM review_cache ORDER BY last_access DESC LIMIT -1 OFFSET ?)',
+                (maxsize,),
+            )
+        return cur.rowcount
+
+    def delete(self, slug=None):
+        conn = self._conn()
+        with conn:
+            if slug is None:
+                conn.execute('DELETE FROM review_cache')
+            else:
+                conn.execute('DELETE FROM review_cache WHERE slug = ?', (slug,))
+
+    def size(self):
+        return self._conn().execute('SELECT COUNT(1) FROM review_cache').fetchone()[0]
+
+    def acquire(self, slug, timeout):
+        """Take the per-slug lease, waiting up to timeout seconds. Returns a token or None."""
+        token = uuid.uuid4().hex
+        deadline = time.monotonic() + timeout
+        conn = self._conn()
+        while True:
+            now = time.time()
+            with conn:
+                cur = conn.execute(
+                    'INSERT INTO review_cache_locks (slug, token, expires_at) VALUES (?, ?, ?) '
+                    'ON CONFLICT(slug) DO UPDATE SET token = excluded.token, expires_at = excluded.expires_at '
+                    'WHERE review_cache_locks.expires_at < ?',
+                    (slug, token, now + self.lease, now),
+                )
+            if cur.rowcount:
+                return token
+            if time.monotonic() >= deadline:
+                return None
+            time.sleep(self.poll)
+
+    def release(self, slug, token):
+        if token is None:
+            return
+        conn = self._conn()
+        with conn:
+            conn.execute('DELETE FROM review_cache_locks WHERE slug = ? AND token = ?', (slug, token))
+
+
+class ReviewCache:
+    """Bounded LRU/TTL cache for scraped reviews, keyed by movie slug.
+
+    - at most `maxsize` slugs are kept; the least recently used is evicted
+    - concurrent lookups for the same slug share one in-flight fetch (across
+      processes too when the backend is shared, e.g. SQLiteBackend)
+    - empty or failed fetches are remembered for `negative_ttl` seconds
+    - an entry fetched with a larger max_reviews also answers smaller requests
+    """
+
+    def __init__(self, maxsize=256, ttl=600, negative_ttl=60, clock=time.time, backend=None, lock_timeout=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.clock = clock
+        self.backend = MemoryBackend() if backend is None else backend
+        self.lock_timeout = lock_timeout
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def _lookup(self, slug, max_reviews, now):
+        entry = self.backend.get(slug)
+        if entry is None:
+            return None
+        ttl = self.ttl if entry['data'] else self.negative_ttl
+        if now - entry['ts'] >= ttl:
+            self.backend.delete(slug)
+            return None
+        data = entry['data']
+        # A short result means the source ran out, so it also covers larger requests.
+        if entry['max_reviews'] >= max_reviews or len(data) < entry['max_reviews']:
+            return data[:max_reviews]
+        return None
+
+    def get(self, slug, max_reviews, fetch_fn):
+        max_reviews = int(max_reviews)
+        while True:
+            # Backend reads run outside self._lock so hits on different slugs
+            # (and SQLite I/O) do not serialize behind each other.
+            data = self._lookup(slug, max_reviews, self.clock())
+            if data is not None:
+                with self._lock:
+                    self.hits += 1
+                return data
+            with self._lock:
+                pending = self._inflight.get(slug)
+                if pending is None:
+                    pending = self._inflight[slug] = threading.Event()
+                    break
+            # Someone else is already fetching this slug; wait and look again.
+            pending.wait()
+
+        token = None
+        try:
+            # Another thread may have stored the entry between our lookup and
+            # taking the in-flight slot, and another process may hold the
+            # slug; once we get the lease, look again.
+            token = self.backend.acquire(slug, self.lock_timeout)
+            data = self._lookup(slug, max_reviews, self.clock())
+            if data is not None:
+                with self._lock:
+                    self.hits += 1
+                return data
+            with self._lock:
+                self.misses += 1
+            data = []
+            try:
+                data = list(fetch_fn() or [])
+                return data[:max_reviews]
+            finally:
+                evicted = self.backend.put(
+                    slug, {'ts': self.clock(), 'max_reviews': max_reviews, 'data': data}, self.maxsize
+                )
+                with self._lock:
+                    self.evictions += evicted
+        finally:
+            self.backend.release(slug, token)
+            with self._lock:
+                del self._inflight[slug]
+            pending.set()
+
+    def invalidate(self, slug=None):
+        self.backend.delete(slug)
+
+    def stats(self):
+        size = self.backend.size()
+        with self._lock:
+            return {
+                'size': size,
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
@@ -0,0 +1,110 @@
+import os
+import sqlite3
+import threading
+import time
+
+DB_PATH = os.path.join(os.path.dirname(__file__), 'app.db')
+
+# Applied to every new connection. WAL lets readers proceed while a writer
+# holds the lock; NORMAL sync is safe under WAL and avoids an fsync per commit.
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-8000",
+)
+
+_local = threading.local()
+
+
+class Connection(sqlite3.Connection):
+    """sqlite3 connection that remembers which schema setups already ran on it (see init_once)."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.initialized = set()
+
+
+def init_once(conn, init):
+    """Run init(conn) (schema DDL and checks) the first time this connection sees it."""
+    done = getattr(conn, 'initialized', None)
+    if done is None:
+        init(conn)
+    elif init not in done:
+        init(conn)
+        done.add(init)
+
+
+def connect(path=None):
+    conn = sqlite3.connect(path or DB_PATH, timeout=5, cached_statements=256, factory=Connection)
+    conn.row_factory = sqlite3.Row
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+def get_db():
+    """The calling thread's connection to app.db, opened on first use.
+
+    Each Flask request runs on one thread, so all queries in a request share
+    one connection (and sqlite3's prepared-statement cache). Callers must not
+    close it; use close_db() when the thread is done with the database.
+    """
+    conn = getattr(_local, 'conn', None)
+    if conn is None or getattr(_local, 'path', None) != DB_PATH:
+        if conn is not None:
+            conn.close()
+        conn = _local.conn = connect()
+        _local.path = DB_PATH
+    return conn
+
+
+def end_request():
+    # Never leave a transaction open on a connection the thread will reuse.
+    conn = getattr(_local, 'conn', None)
+    if conn is not None and conn.in_transaction:
+        conn.rollback()
+
+
+def close_db():
+    conn = getattr(_local, 'conn', None)
+    if conn is not None:
+        _local.conn = None
+        conn.close()
+
+
+class RowCache:
+    """Tiny thread-safe TTL cache for hot lookup rows (users, settings).
+
+    Entries expire after `ttl` seconds so changes made by other processes are
+    picked up; writes in this process invalidate explicitly.
+    """
+
+    _MISSING = object()
+
+    def __init__(self, ttl=30, maxsize=1024):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, loader):
+        now = time.monotonic()
+        with self._lock:
+            hit = self._data.get(key, self._MISSING)
+        if hit is not self._MISSING and now - hit[0] < self.ttl:
+            return hit[1]
+        value = loader()
+        with self._lock:
+            if len(self._data) >= self.maxsize:
+                self._data.clear()
+            self._data[key] = (now, value)
+        return value
+
+    def invalidate(self, key=None):
+        with self._lock:
+            if key is None:
+                self._data.clear()
+            else:
+                self._data.pop(key, None)
@@ -1,17 +1,22 @@
 import argparse
+import multiprocessing
 import os
 import csv
+import json
 import time
 from datetime import datetime
-from collections import Counter, defaultdict
-
-import pandas as pd
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
 
+import archive
+import db
+import metrics
+from aggregates import movie_summary
+from language import detect_lang, detect_langs
+from profiling import Profiler
 from scraper import get_reviews
-
-STOPWORDS = set(
-    "a an the and or but if in on to for with at by from of is are was were be been being as it its this that those these you your our we they them their i me my he she his her him what which who whom where when why how not no yes up down over under again further then once here there all any both each few more most other some such only own same so than too very can will just don don should now".split()
-)
+from store import add_scored, init_store, known_hashes, remove_movie
+from terms import STOPWORDS, content_hash, doc_terms, index_terms, tokenize, top_terms
 
 EMOJI_MAP = {
     'Positive': '😄',
@@ -19,21 +24,6 @@ EMOJI_MAP = {
     'Negative': '☹️',
 }
 
-# naive language detection without heavy deps (very rough)
-# user can improve in Power BI or we can switch to langdetect if installed
-try:
-    from langdetect import detect, DetectorFactory
-    DetectorFactory.seed = 0
-    def detect_lang(text: str) -> str:
-        try:
-            return detect(text)
-        except Exception:
-            return 'und'
-except Exception:
-    def detect_lang(text: str) -> str:
-        return 'und'
-
-
 def name_to_slug(name: str) -> str:
     return name.replace(" ", "-").lower()
 
@@ -47,14 +37,13 @@ def label_sentiment(score: float) -> str:
 
 
 def build_sentiment():
-    # Try to use VADER if available without downloads; otherwise fallback
+    # Returns a scorer taking a list of reviews and returning their scores.
+    # Use the process-wide VADER analyzer from sentiment.py (precompiled,
+    # movie-tuned lexicon, no downloads, repeats scored once); otherwise fallback
     try:
-        from nltk.sentiment.vader import SentimentIntensityAnalyzer
-        try:
-            sid = SentimentIntensityAnalyzer()
-            return lambda text: sid.polarity_scores(text).get('compound', 0.0)
-        except Exception:
-            pass
+        from sentiment import analyze_sentiment_batch as vader
+        vader(['ok'])
+        return lambda texts: vader(texts).tolist()
     except Exception:
         pass
     # Heuristic fallback based on positive/negative word lists
@@ -77,123 +66,555 @@ def build_sentiment():
         if score == 0:
             return 0.0
         return max(-1.0, min(1.0, score / 5.0))
-    return heuristic
+    return lambda texts: [heuristic(t) for t in texts]
 
 
-analyze_sentiment = build_sentiment()
+analyze_sentiment_batch = build_sentiment()
+
+
+REVIEW_COLUMNS = ['movie', 'slug', 'review', 'sentiment_score', 'sentiment_label', 'emoji', 'language',
+                  'platform', 'created_at', 'genre', 'is_manual_injection']
+MOVIE_COLUMNS = ['movie', 'slug', 'total_reviews', 'avg_sentiment', 'top_positive_review',
+                 'top_negative_review', 'genre', 'platform', 'last_scraped_at']
+WORD_COLUMNS = ['movie', 'slug', 'word', 'count', 'genre']
+# Per-stage seconds for the movie: fetch is the scrape's wall time (parsing
+# included), parse the extraction time summed over pages, score sentiment and
+# language tagging, aggregate tokenizing plus the store/aggregate reads, and
+# write appending the movie's rows to the outputs.
+STAGES = ('fetch', 'parse', 'score', 'aggregate', 'write')
+STATUS_COLUMNS = ['movie', 'slug', 'status', 'error', 'scraped_count', 'timestamp', 'manual_injection'] + \
+    [f'{s}_seconds' for s in STAGES]
+
+TABLES = {
+    'reviews': REVIEW_COLUMNS,
+    'movies': MOVIE_COLUMNS,
+    'words': WORD_COLUMNS,
+    'status_logs': STATUS_COLUMNS,
+}
+
+# Parquet output is optional; it needs pyarrow.
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except Exception:
+    pa = None
+    pq = None
 
 
-def tokenize(text: str):
-    # very simple tokenizer
-    tokens = []
-    word = []
-    for ch in text.lower():
-        if ch.isalpha():
-            word.append(ch)
+class CsvSink:
+    """Appends rows to <out_dir>/<table>.csv as they arrive."""
+
+    def __init__(self, out_dir, table, columns):
+        self.path = os.path.join(out_dir, f'{table}.csv')
+        self.columns = columns
+        self._f = open(self.path, 'w', encoding='utf-8', newline='')
+        self._writer = csv.DictWriter(self._f, fieldnames=columns, lineterminator='\n')
+        self._writer.writeheader()
+
+    def write(self, rows):
+        if rows:
+            self._writer.writerows(rows)
+            self._f.flush()
+
+    def close(self):
+        self._f.close()
+
+
+class ParquetSink:
+    """Writes one Parquet row group per movie to <out_dir>/<table>.parquet."""
+
+    def __init__(self, out_dir, table, columns):
+        if pq is None:
+            raise RuntimeError('Parquet output requires pyarrow (pip install pyarrow)')
+        self.path = os.path.join(out_dir, f'{table}.parquet')
+        self.columns = columns
+        self._writer = None
+
+    def write(self, rows):
+        if not rows:
+            return
+        batch = pa.Table.from_pylist(rows).select(self.columns)
+        if self._writer is None:
+            self._writer = pq.ParquetWriter(self.path, batch.schema)
         else:
-            if word:
-                tokens.append(''.join(word))
-                word = []
-    if word:
-        tokens.append(''.join(word))
-    return [t for t in tokens if t and t not in STOPWORDS and len(t) > 2]
+            batch = batch.cast(self._writer.schema)
+        self._writer.write_table(batch)
 
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
 
-def export_powerbi(movies, max_reviews=50, out_dir='powerbi_export', genres_map=None, manual=False):
-    os.makedirs(out_dir, exist_ok=True)
-    ts = datetime.utcnow().replace(microsecond=0).isoformat() + 'Z'
 
-    reviews_rows = []
-    movies_rows = []
-    words_rows = []
-    status_rows = []
+SINKS = {'csv': CsvSink, 'parquet': ParquetSink}
 
-    for movie in movies:
-        genre = genres_map.get(movie, '') if genres_map else ''
-        slug = name_to_slug(movie)
-        status = 'success'
-        err = ''
+
+def _scrape(movie, slug, max_reviews):
+    with metrics.collect() as timings:
+        start = time.perf_counter()
         try:
             texts = get_reviews(slug, max_reviews=max_reviews, delay=1, fast=True, debug=False)
+            # One row per distinct review, as the store keeps them.
+            texts, status, err = list(dict.fromkeys(texts)), 'success', ''
         except Exception as e:
-            texts = []
-            status = 'failure'
-            err = str(e)
-
-        sentiments = []
-        languages = []
-        top_pos = ('', -1.0)
-        top_neg = ('', 1.0)
-
-        for t in texts:
-            s = analyze_sentiment(t)
-            lbl = label_sentiment(s)
-            lang = detect_lang(t)
-            languages.append(lang)
-            sentiments.append(s)
-            emoji = EMOJI_MAP.get(lbl, '')
-            reviews_rows.append({
-                'movie': movie,
-                'slug': slug,
-                'review': t,
-                'sentiment_score': round(s, 4),
-                'sentiment_label': lbl,
-                'emoji': emoji,
-                'language': lang,
-                'platform': 'Letterboxd',
-                'created_at': ts,
-                'genre': genre,
-                'is_manual_injection': bool(manual),
-            })
-            if s > top_pos[1]:
-                top_pos = (t, s)
-            if s < top_neg[1]:
-                top_neg = (t, s)
-
-        # movie aggregates
-        total = len(texts)
-        avg = round(sum(sentiments) / total, 4) if total else 0.0
-        movies_rows.append({
+            texts, status, err = [], 'failure', str(e)
+    return texts, status, err, {'fetch': time.perf_counter() - start, 'parse': timings.get('parse')}
+
+
+def analyze_movie(movie, slug, genre, texts, ts, manual):
+    """Score, language-tag and tokenize one movie's reviews.
+
+    CPU-bound and free of shared state, so it can run in a worker process.
+    Returns (review_rows, scored, docs, timings): scored is [(text, raw score)]
+    for the store (whose aggregates give movies.csv), docs are per-review
+    term counts for its term index (see terms.doc_terms) and timings the
+    seconds spent per stage.
+    """
+    review_rows = []
+    with metrics.collect() as timings:
+        with metrics.stage('score'):
+            langs = detect_langs(texts)
+            scored = list(zip(texts, analyze_sentiment_batch(texts)))
+        # term counts for the word cloud, merged into the index by the caller
+        with metrics.stage('aggregate'):
+            docs = doc_terms(texts)
+
+    for (t, s), lang in zip(scored, langs):
+        lbl = label_sentiment(s)
+        review_rows.append({
             'movie': movie,
             'slug': slug,
-            'total_reviews': total,
-            'avg_sentiment': avg,
-            'top_positive_review': top_pos[0],
-            'top_negative_review': top_neg[0],
-            'genre': genre,
+            'review': t,
+            'sentiment_score': round(s, 4),
+            'sentiment_label': lbl,
+            'emoji': EMOJI_MAP.get(lbl, ''),
+            'language': lang,
             'platform': 'Letterboxd',
-            'last_scraped_at': ts,
+            'created_at': ts,
+            'genre': genre,
+            'is_manual_injection': bool(manual),
         })
+    return review_rows, scored, docs, timings.as_dict()
 
-        # words for word cloud
-        word_counts = Counter()
-        for t in texts:
-            word_counts.update(tokenize(t))
-        for w, c in word_counts.most_common(200):
-            words_rows.append({
-                'movie': movie,
-                'slug': slug,
-                'word': w,
-                'count': c,
-                'genre': genre,
-            })
-
-        status_rows.append({
-            'movie': movie,
-            'slug': slug,
-            'status': status,
-            'error': err,
-            'scraped_count': len(texts),
-            'timestamp': ts,
-            'manual_injection': bool(manual),
-        })
 
-    # Save CSVs
-    pd.DataFrame(reviews_rows).to_csv(os.path.join(out_dir, 'reviews.csv'), index=False)
-    pd.DataFrame(movies_rows).to_csv(os.path.join(out_dir, 'movies.csv'), index=False)
-    pd.DataFrame(words_rows).to_csv(os.path.join(out_dir, 'words.csv'), index=False)
-    pd.DataFrame(status_rows).to_csv(os.path.join(out_dir, 'status_logs.csv'), index=False)
+WORD_LIMIT = 200
+# The export's own review store, kept in the output directory.
+EXPORT_DB_FILE = '.export_store.db'
+
+
+def open_store(out_dir, path=None):
+    """Connection to the export's review store (<out_dir>/.export_store.db unless another path is given).
+
+    The store holds exactly the exported reviews of each movie, replacing any
+    others it has for the movie, so it must not be the web app's app.db.
+    """
+    path = path or os.path.join(out_dir, EXPORT_DB_FILE)
+    if os.path.abspath(path) == os.path.abspath(db.DB_PATH):
+        raise ValueError(f'the export store cannot be the web app database ({db.DB_PATH})')
+    conn = db.connect(path)
+    init_store(conn)
+    return conn
+
+
+def _sync_store(conn, slug, texts):
+    """Make the store hold none of slug's reviews but `texts`; returns the content hashes it holds.
+
+    A movie with other stored reviews (from an earlier export) is dropped.
+    """
+    stored = known_hashes(conn, slug)
+    if stored - {content_hash(t) for t in texts}:
+        remove_movie(conn, slug)
+        return set()
+    return stored
+
+
+def _store_movie(conn, slug, scored, docs):
+    # Add the movie's newly analysed reviews; the store's triggers keep its
+    # aggregates current and the term index only counts unseen reviews.
+    add_scored(conn, slug, scored, label=label_sentiment)
+    index_terms(conn, slug, docs)
+
+
+def _movie_row(conn, movie, slug, genre, ts):
+    # The movie's aggregates in the store, which holds exactly its exported reviews.
+    summary = movie_summary(conn, slug)
+    return {
+        'movie': movie,
+        'slug': slug,
+        'total_reviews': summary['total'] if summary else 0,
+        'avg_sentiment': round(summary['mean'], 4) if summary else 0.0,
+        'top_positive_review': summary['max_review'] if summary else '',
+        'top_negative_review': summary['min_review'] if summary else '',
+        'genre': genre,
+        'platform': 'Letterboxd',
+        'last_scraped_at': ts,
+    }
+
+
+def _word_rows(conn, movie, slug, genre, bigrams=False):
+    # Top terms of the movie's exported reviews, read from the store's term index.
+    ngrams = (1, 2) if bigrams else (1,)
+    return [
+        {'movie': movie, 'slug': slug, 'word': w, 'count': c, 'genre': genre}
+        for n in ngrams
+        for w, c in top_terms(conn, slug, n=n, limit=WORD_LIMIT)
+    ]
+
+
+def _cpu_pool(processes):
+    # Workers come from a forkserver (spawn where there is none), never a
+    # fork of this process: by now it runs scrape and page-fetch threads, and
+    # a forked child could inherit a lock one of them holds and deadlock.
+    methods = multiprocessing.get_all_start_methods()
+    ctx = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+    return ProcessPoolExecutor(max_workers=processes, mp_context=ctx)
+
+
+def _run_inline(fn, *args):
+    fut = Future()
+    try:
+        fut.set_result(fn(*args))
+    except Exception as e:
+        fut.set_exception(e)
+    return fut
+
+
+def _pipeline(movies, max_reviews, genres_map, manual, ts, scrape_workers, processes, pick_texts=None, window=None):
+    """Yield (movie, slug, genre, texts, status, err, timings, analysis) per movie, in input order.
+
+    Scrapes run concurrently on `scrape_workers` threads and each finished
+    scrape is handed to a pool of `processes` worker processes (0 = in this
+    process) for analyze_movie. At most `window` movies are in flight at
+    once, scraping or analysing (by default enough to keep both pools busy);
+    the next movie is only started when one has been yielded.
+    pick_texts(slug, texts), if given, returns the scraped texts that need
+    analysing (by default all of them). texts are the scraped reviews,
+    timings a metrics.StageTimings holding the scrape and analysis times so
+    far and analysis analyze_movie's (review_rows, scored, docs) for the
+    picked texts.
+    """
+    cpu_workers = 0 if processes == 0 else (processes or os.cpu_count() or 1)
+    window = window or max(1, scrape_workers) * 2 + cpu_workers
+    scrape_pool = ThreadPoolExecutor(max_workers=max(1, scrape_workers), thread_name_prefix="export-scrape")
+    cpu_pool = _cpu_pool(processes) if processes != 0 else None
+    scraping = deque()
+    analysing = deque()
+    movie_iter = iter(movies)
+
+    def submit_next():
+        movie = next(movie_iter, None)
+        if movie is None:
+            return
+        genre = genres_map.get(movie, '') if genres_map else ''
+        slug = name_to_slug(movie)
+        scraping.append((movie, slug, genre, scrape_pool.submit(_scrape, movie, slug, max_reviews)))
+
+    try:
+        for _ in range(window):
+            submit_next()
+        while scraping or analysing:
+            # Hand every finished scrape (in order) to the CPU pool, so
+            # several analyses run at once.
+            while scraping and (scraping[0][3].done() or not analysing):
+                movie, slug, genre, scrape_fut = scraping.popleft()
+                texts, status, err, scrape_timings = scrape_fut.result()
+                picked = texts if pick_texts is None else pick_texts(slug, texts)
+                args = (movie, slug, genre, picked, ts, manual)
+                fut = cpu_pool.submit(analyze_movie, *args) if cpu_pool else _run_inline(analyze_movie, *args)
+                analysing.append((movie, slug, genre, texts, status, err, scrape_timings, fut))
+            if scraping and not analysing[0][7].done():
+                # Until the oldest analysis is done, keep feeding the pool
+                # with scrapes as they finish.
+                wait([analysing[0][7], scraping[0][3]], return_when=FIRST_COMPLETED)
+                continue
+            movie, slug, genre, texts, status, err, scrape_timings, fut = analysing.popleft()
+            review_rows, scored, docs, analysis_timings = fut.result()
+            submit_next()
+            timings = metrics.StageTimings()
+            timings.update(scrape_timings)
+            timings.update(analysis_timings)
+            yield movie, slug, genre, texts, status, err, timings, (review_rows, scored, docs)
+    finally:
+        scrape_pool.shutdown(wait=True, cancel_futures=True)
+        if cpu_pool is not None:
+            cpu_pool.shutdown(wait=True)
+
+
+def _status_row(movie, slug, status, err, count, ts, manual, timings):
+    row = {
+        'movie': movie,
+        'slug': slug,
+        'status': status,
+        'error': err,
+        'scraped_count': count,
+        'timestamp': ts,
+        'manual_injection': bool(manual),
+    }
+    for stage in STAGES:
+        row[f'{stage}_seconds'] = round(timings.get(stage), 4)
+    return row
+
+
+def export_powerbi(movies, max_reviews=50, out_dir='powerbi_export', genres_map=None, manual=False,
+                   formats=('csv',), scrape_workers=4, processes=None,
+                   incremental=False, stale_after_hours=24, db_path=None, bigrams=False):
+    """Scrape, analyze and export movies as a streaming pipeline.
+
+    Each movie's rows are appended to the output files as soon as it is
+    done, in input order, so memory stays bounded however long the list is.
+    `formats` is any of 'csv' and 'parquet'. With incremental=True only
+    stale or previously failed movies are re-scraped; see export_incremental.
+
+    movies.csv and words.csv aggregate exactly the reviews in reviews.csv.
+    Each movie's exported reviews are kept in the review store in `db_path`
+    (<out_dir>/.export_store.db by default), replacing the ones an earlier
+    export stored for it, and words.csv is read from its term index.
+    bigrams=True adds the top word pairs to words.csv.
+    """
+    if incremental:
+        return export_incremental(
+            movies, max_reviews=max_reviews, out_dir=out_dir, genres_map=genres_map, manual=manual,
+            formats=formats, scrape_workers=scrape_workers, processes=processes,
+            stale_after_hours=stale_after_hours, db_path=db_path, bigrams=bigrams,
+        )
+    os.makedirs(out_dir, exist_ok=True)
+    ts = datetime.utcnow().replace(microsecond=0).isoformat() + 'Z'
+
+    sinks = {table: [SINKS[fmt](out_dir, table, columns) for fmt in formats] for table, columns in TABLES.items()}
+
+    def emit(table, rows):
+        for sink in sinks[table]:
+            sink.write(rows)
+
+    store = open_store(out_dir, db_path)
+
+    def pick_texts(slug, texts):
+        # Everything scraped is analysed; the store keeps only these reviews.
+        _sync_store(store, slug, texts)
+        return texts
+
+    try:
+        results = _pipeline(movies, max_reviews, genres_map, manual, ts, scrape_workers, processes, pick_texts)
+        for movie, slug, genre, texts, status, err, timings, (review_rows, scored, docs) in results:
+            with metrics.collect(timings):
+                with metrics.stage('aggregate'):
+                    _store_movie(store, slug, scored, docs)
+                    movie_rows = [_movie_row(store, movie, slug, genre, ts)]
+                    word_rows = _word_rows(store, movie, slug, genre, bigrams)
+                with metrics.stage('write'):
+                    emit('reviews', review_rows)
+                    emit('movies', movie_rows)
+                    emit('words', word_rows)
+            emit('status_logs', [_status_row(movie, slug, status, err, len(texts), ts, manual, timings)])
+    finally:
+        store.close()
+        for table_sinks in sinks.values():
+            for sink in table_sinks:
+                sink.close()
+
+    return out_dir
+
+
+# --- Incremental / resumable export ---
+CHECKPOINT_FILE = '.export_checkpoint.json'
+
+
+def _read_table(out_dir, table):
+    path = os.path.join(out_dir, f'{table}.csv')
+    if not os.path.exists(path):
+        return
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        yield from csv.DictReader(f)
+
+
+def _parse_ts(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%dT%H:%M:%SZ')
+    except (TypeError, ValueError):
+        return None
+
+
+def plan_refresh(movies, out_dir, stale_after_hours=24, now=None):
+    """Return the slugs among `movies` that need scraping.
 
+    A movie is refreshed when it is not in the previous export, its
+    last_scraped_at is older than stale_after_hours, or its last status
+    was not a success.
+    """
+    now = now or datetime.utcnow()
+    last_scraped = {r['slug']: _parse_ts(r.get('last_scraped_at')) for r in _read_table(out_dir, 'movies')}
+    last_status = {r['slug']: r.get('status') for r in _read_table(out_dir, 'status_logs')}
+    refresh = []
+    for movie in movies:
+        slug = name_to_slug(movie)
+        scraped = last_scraped.get(slug)
+        if (scraped is None
+                or (now - scraped).total_seconds() >= stale_after_hours * 3600
+                or last_status.get(slug) != 'success'):
+            refresh.append(slug)
+    return refresh
+
+
+class _Checkpoint:
+    """Progress of an incremental run, rewritten atomically after each movie.
+
+    Records the run timestamp, finished slugs and the size of every partial
+    output file at that point, so a resumed run can truncate any half-written
+    movie and carry on after the last finished one. Once the partial files
+    are complete it is marked finalized, and a resumed run only renames them.
+    """
+
+    def __init__(self, out_dir):
+        self.path = os.path.join(out_dir, CHECKPOINT_FILE)
+        self.data = None
+        if os.path.exists(self.path):
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.data = json.load(f)
+
+    def start(self, ts, refresh):
+        self.data = {'ts': ts, 'refresh': refresh, 'done': [], 'offsets': {}}
+        self.save()
+
+    def save(self):
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self.data, f)
+        os.replace(tmp, self.path)
+
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def _partial_path(out_dir, table):
+    return os.path.join(out_dir, f'{table}.csv.partial')
+
+
+class _AppendCsv:
+    def __init__(self, path, columns, offset=None):
+        fresh = offset is None or not os.path.exists(path)
+        self._f = open(path, 'w' if fresh else 'r+', encoding='utf-8', newline='')
+        if not fresh:
+            self._f.seek(offset)
+            self._f.truncate()
+        self._writer = csv.DictWriter(self._f, fieldnames=columns, lineterminator='\n', extrasaction='ignore')
+        if fresh:
+            self._writer.writeheader()
+
+    def write(self, rows):
+        self._writer.writerows(rows)
+
+    def tell(self):
+        self._f.flush()
+        return self._f.tell()
+
+    def close(self):
+        self._f.close()
+
+
+def _write_partials(movies, out_dir, checkpoint, max_reviews, genres_map, manual, scrape_workers, processes,
+                    db_path, bigrams):
+    # Build the *.csv.partial files of the run in `checkpoint`, carrying on
+    # after the movies it already has.
+    ts = checkpoint.data['ts']
+    refresh_set = set(checkpoint.data['refresh'])
+    done = set(checkpoint.data['done'])
+
+    # Rows already exported for the movies being refreshed, to merge with.
+    previous = {}
+    for row in _read_table(out_dir, 'reviews'):
+        if row['slug'] in refresh_set:
+            previous.setdefault(row['slug'], {})[row['review']] = row
+
+    def pick_texts(slug, texts):
+        # Analyse what is new, plus any exported review the store lacks (its
+        # aggregates and term counts are needed for movies.csv/words.csv).
+        prev = previous.get(slug, {})
+        stored = _sync_store(store, slug, [*prev, *texts])
+        return [t for t in dict.fromkeys([*prev, *texts]) if t not in prev or content_hash(t) not in stored]
+
+    offsets = checkpoint.data['offsets']
+    writers = {
+        table: _AppendCsv(_partial_path(out_dir, table), columns, offsets.get(table))
+        for table, columns in TABLES.items()
+    }
+    store = open_store(out_dir, db_path)
+    try:
+        todo = [m for m in movies if name_to_slug(m) in refresh_set and name_to_slug(m) not in done]
+        results = _pipeline(todo, max_reviews, genres_map, manual, ts, scrape_workers, processes, pick_texts)
+        for movie, slug, genre, texts, status, err, timings, (analysed, scored, docs) in results:
+            prev = previous.get(slug, {})
+            analysed = {row['review']: row for row in analysed}
+            review_rows = []
+            for t in dict.fromkeys([*prev, *texts]):
+                row = analysed.get(t)
+                if row is None:
+                    row = dict(prev[t], movie=movie, genre=genre, is_manual_injection=bool(manual))
+                elif t in prev:
+                    row['created_at'] = prev[t]['created_at']
+                review_rows.append(row)
+            with metrics.collect(timings):
+                with metrics.stage('aggregate'):
+                    _store_movie(store, slug, scored, docs)
+                    movie_rows = [_movie_row(store, movie, slug, genre, ts)]
+                    word_rows = _word_rows(store, movie, slug, genre, bigrams)
+                with metrics.stage('write'):
+                    writers['reviews'].write(review_rows)
+                    writers['movies'].write(movie_rows)
+                    writers['words'].write(word_rows)
+            scraped = sum(t not in prev for t in texts) if status == 'success' else 0
+            writers['status_logs'].write([_status_row(movie, slug, status, err, scraped, ts, manual, timings)])
+            checkpoint.data['done'].append(slug)
+            checkpoint.data['offsets'] = {t: w.tell() for t, w in writers.items()}
+            checkpoint.save()
+
+        # Carry over every movie that was not refreshed in this run.
+        for table, writer in writers.items():
+            writer.write(r for r in _read_table(out_dir, table) if r['slug'] not in refresh_set)
+            writer.close()
+    finally:
+        store.close()
+        for writer in writers.values():
+            writer.close()
+
+
+def export_incremental(movies, max_reviews=50, out_dir='powerbi_export', genres_map=None, manual=False,
+                       formats=('csv',), scrape_workers=4, processes=None, stale_after_hours=24,
+                       db_path=None, bigrams=False):
+    """Refresh only stale or failed movies and merge them into the previous export.
+
+    New reviews are merged with the ones already exported for the movie
+    (deduplicated by text), and movies.csv/words.csv aggregate the merged
+    reviews. Only the new reviews are analysed: the exported ones keep their
+    rows from reviews.csv, and their aggregates and term counts are already
+    in the store. Rows of movies that were not refreshed are carried over
+    as is. Output is built in *.csv.partial files with a checkpoint after
+    every movie; rerunning after a crash resumes where the previous run
+    stopped.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    checkpoint = _Checkpoint(out_dir)
+    if checkpoint.data is None:
+        ts = datetime.utcnow().replace(microsecond=0).isoformat() + 'Z'
+        checkpoint.start(ts, plan_refresh(movies, out_dir, stale_after_hours))
+    if not checkpoint.data.get('finalized'):
+        _write_partials(movies, out_dir, checkpoint, max_reviews, genres_map, manual, scrape_workers, processes,
+                        db_path, bigrams)
+        # Every partial file is complete: a crash from here on resumes by
+        # finishing the renames, never by building them again.
+        checkpoint.data['finalized'] = True
+        checkpoint.save()
+    for table in TABLES:
+        partial = _partial_path(out_dir, table)
+        if os.path.exists(partial):
+            os.replace(partial, os.path.join(out_dir, f'{table}.csv'))
+    checkpoint.clear()
+
+    if 'parquet' in formats:
+        if pq is None:
+            raise RuntimeError('Parquet output requires pyarrow (pip install pyarrow)')
+        from pyarrow import csv as pa_csv
+        for table in TABLES:
+            pq.write_table(pa_csv.read_csv(os.path.join(out_dir, f'{table}.csv')), os.path.join(out_dir, f'{table}.parquet'))
     return out_dir
 
 
@@ -217,15 +638,40 @@ if __name__ == '__main__':
     parser.add_argument('--out', type=str, default='powerbi_export', help='Output directory for CSVs')
     parser.add_argument('--genres', type=str, default='', help='Optional mapping: "Movie:Genre, Movie2:Genre2"')
     parser.add_argument('--manual-injection', action='store_true', help='Mark data as manually injected')
+    parser.add_argument('--format', dest='formats', choices=sorted(SINKS), nargs='+', default=['csv'], help='Output format(s): csv, parquet')
+    parser.add_argument('--scrape-workers', type=int, default=4, help='Movies scraped concurrently')
+    parser.add_argument('--processes', type=int, default=None, help='Worker processes for scoring/tokenizing (0 = in-process)')
+    parser.add_argument('--incremental', action='store_true', help='Only re-scrape stale or failed movies and merge into the existing export (resumes an interrupted run)')
+    parser.add_argument('--stale-after', dest='stale_after_hours', type=float, default=24, help='Hours after which a movie counts as stale in --incremental mode')
+    parser.add_argument('--db', dest='db_path', type=str, default=None, help=f'SQLite review store holding the exported reviews (default: <out>/{EXPORT_DB_FILE}; not the web app\'s app.db)')
+    parser.add_argument('--bigrams', action='store_true', help='Also export the top word pairs to words.csv')
+    parser.add_argument('--profile', action='store_true', help='Save a flame graph profile of this run to data/profiles/ (use --processes 0 to include scoring)')
+    replay = parser.add_mutually_exclusive_group()
+    replay.add_argument('--record', metavar='ARCHIVE', nargs='?', const=archive.ARCHIVE_PATH, help='Save every scraped page to a scrape archive')
+    replay.add_argument('--replay', metavar='ARCHIVE', nargs='?', const=archive.ARCHIVE_PATH, help='Scrape from a recorded archive only (no network, no browser)')
 
     args = parser.parse_args()
+    if args.record or args.replay:
+        archive.configure('record' if args.record else 'replay', args.record or args.replay)
     default_movies = ["The Dark Knight", "Barbie 2023", "Oppenheimer"]
     movies = args.movies if args.movies else default_movies
-    out = export_powerbi(
-        movies=movies,
-        max_reviews=args.max_reviews,
-        out_dir=args.out,
-        genres_map=parse_genres(args.genres),
-        manual=args.manual_injection,
-    )
-    print(f"Exported CSVs to: {out}")
+    profiler = Profiler(label='export_powerbi').start() if args.profile else None
+    try:
+        out = export_powerbi(
+            movies=movies,
+            max_reviews=args.max_reviews,
+            out_dir=args.out,
+            genres_map=parse_genres(args.genres),
+            manual=args.manual_injection,
+            formats=args.formats,
+            scrape_workers=args.scrape_workers,
+            processes=args.processes,
+            incremental=args.incremental,
+            stale_after_hours=args.stale_after_hours,
+            db_path=args.db_path,
+            bigrams=args.bigrams,
+        )
+    finally:
+        if profiler is not None:
+            print(f"Profile saved to: {profiler.stop()}")
+    print(f"Exported {', '.join(args.formats)} datasets to: {out}")
@@ -0,0 +1,261 @@
+import hashlib
+import inspect
+import json
+import os
+import tempfile
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+import archive
+import metrics
+import scheduler
+
+# Retries for connection errors, with exponential backoff (backoff * 2 **
+# (attempt - 1) seconds between tries). Throttling and 5xx responses are
+# retried by the per-host scheduler instead, which pauses the whole host.
+HTTP_RETRIES = int(os.environ.get('SCRAPER_HTTP_RETRIES', '3'))
+HTTP_BACKOFF = float(os.environ.get('SCRAPER_HTTP_BACKOFF', '0.5'))
+HTTP_POOL_SIZE = int(os.environ.get('SCRAPER_HTTP_POOL_SIZE', '10'))
+RESPONSE_CACHE_DIR = os.environ.get('SCRAPER_HTTP_CACHE_DIR', os.path.join(os.path.dirname(__file__), 'data', 'http_cache'))
+# Entries older than this many days, then the oldest beyond the size cap,
+# are deleted; checked at most once per RESPONSE_CACHE_PRUNE_INTERVAL seconds.
+RESPONSE_CACHE_MAX_AGE = float(os.environ.get('SCRAPER_HTTP_CACHE_MAX_AGE_DAYS', '14')) * 86400
+RESPONSE_CACHE_MAX_BYTES = int(float(os.environ.get('SCRAPER_HTTP_CACHE_MAX_MB', '200')) * 1024 * 1024)
+RESPONSE_CACHE_PRUNE_INTERVAL = 60
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def build_session(retries=HTTP_RETRIES, backoff=HTTP_BACKOFF, pool_size=HTTP_POOL_SIZE):
+    retry = Retry(
+        total=retries,
+        backoff_factor=backoff,
+        allowed_methods=frozenset(['GET', 'HEAD']),
+        respect_retry_after_header=False,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def get_session():
+    # One process-wide session so keep-alive connections are reused per host.
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = build_session()
+        return _session
+
+
+class ResponseCache:
+    """On-disk cache of GET responses keyed by URL.
+
+    Each entry keeps the validators (ETag / Last-Modified), the body, and the
+    results of any parsers run over it, so a 304 can skip parsing entirely.
+    Entries older than max_age seconds are dropped, and the oldest beyond
+    max_bytes in total, by prune(), which put() runs now and then.
+    """
+
+    def __init__(self, root=RESPONSE_CACHE_DIR, max_age=RESPONSE_CACHE_MAX_AGE, max_bytes=RESPONSE_CACHE_MAX_BYTES,
+                 prune_interval=RESPONSE_CACHE_PRUNE_INTERVAL):
+        self.root = root
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self.prune_interval = prune_interval
+        self._last_prune = float('-inf')
+        self._prune_lock = threading.Lock()
+
+    def _path(self, url):
+        return os.path.join(self.root, hashlib.sha1(url.encode('utf-8')).hexdigest() + '.json')
+
+    def get(self, url):
+        try:
+            with open(self._path(url), 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry.get('url') != url or time.time() - entry.get('fetched_at', 0) > self.max_age:
+            return None
+        return entry
+
+    def put(self, url, entry):
+        entry = dict(entry, url=url)
+        os.makedirs(self.root, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.root, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(entry, f)
+            os.replace(tmp, self._path(url))
+        except Exception:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            raise
+        self._maybe_prune()
+
+    def _maybe_prune(self):
+        now = time.monotonic()
+        if now - self._last_prune < self.prune_interval or not self._prune_lock.acquire(blocking=False):
+            return
+        try:
+            self._last_prune = now
+            self.prune()
+        finally:
+            self._prune_lock.release()
+
+    def prune(self):
+        """Delete expired entries, then the least recently written ones until under max_bytes.
+
+        Returns the number of files removed.
+        """
+        files = []
+        try:
+            with os.scandir(self.root) as it:
+                for e in it:
+                    if e.name.endswith('.json'):
+                        try:
+                            st = e.stat()
+                        except OSError:
+                            continue
+                        files.append((st.st_mtime, st.st_size, e.path))
+        except OSError:
+            return 0
+        files.sort()
+        cutoff = time.time() - self.max_age
+        total = sum(size for _, size, _ in files)
+        removed = 0
+        for mtime, size, path in files:
+            if mtime >= cutoff and total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+        return removed
+
+
+RESPONSE_CACHE = ResponseCache()
+
+
+_parser_keys = {}
+
+
+def parser_key(parse):
+    """Key parse's results are cached under: its name plus a hash of its module's source.
+
+    Editing the parser's module (review_extract's XPath, say) changes the
+    key, so results of the old code are not served from the cache.
+    """
+    key = _parser_keys.get(parse)
+    if key is None:
+        name = getattr(parse, '__qualname__', repr(parse))
+        try:
+            with open(inspect.getsourcefile(parse), 'rb') as f:
+                version = hashlib.sha1(f.read()).hexdigest()[:12]
+        except (OSError, TypeError):
+            version = ''
+        key = _parser_keys[parse] = f'{name}@{version}'
+    return key
+
+
+def _cached_result(cache, url, entry, parser, parse, revalidated=False):
+    # The parsed result of a cached body, parsing (and storing it) on first
+    # use. A revalidated entry (304) counts as fetched now.
+    parsed = entry.get('parsed', {})
+    changed = revalidated
+    if revalidated:
+        entry['fetched_at'] = time.time()
+    if parser in parsed:
+        result = parsed[parser]
+    else:
+        with metrics.stage('parse'):
+            result = parse(entry['body'])
+        # Results of older versions of the same parser are dropped.
+        name = parser.split('@')[0]
+        parsed = {k: v for k, v in parsed.items() if k.split('@')[0] != name}
+        parsed[parser] = result
+        entry['parsed'] = parsed
+        changed = True
+    if changed:
+        try:
+            cache.put(url, entry)
+        except OSError:
+            pass
+    return result
+
+
+def cached_get(url, parse, headers=None, timeout=10, cache=None):
+    """GET url and return parse(body), revalidating against the response cache.
+
+    Returns None for non-200 responses. When the server answers 304 the
+    previously parsed result is returned without touching the body. Requests
+    go through the host's scheduler; while it is throttling or its circuit is
+    open, a cached copy of the page is served stale, and without one
+    scheduler.HostUnavailable propagates. In archive replay mode the page
+    comes from the scrape archive instead (never the network), and in record
+    mode every page used is added to it.
+    """
+    if archive.replaying():
+        page = archive.current().get(url)
+        if page is None or page[0] != 200 or not page[1]:
+            return None
+        with metrics.stage('parse'):
+            return parse(page[1])
+
+    cache = RESPONSE_CACHE if cache is None else cache
+    parser = parser_key(parse)
+    entry = cache.get(url)
+    req_headers = dict(headers or {})
+    if entry:
+        if entry.get('etag'):
+            req_headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            req_headers['If-Modified-Since'] = entry['last_modified']
+
+    try:
+        with metrics.stage('fetch'):
+            resp = scheduler.for_url(url).request(
+                lambda: get_session().get(url, headers=req_headers, timeout=timeout), retries=HTTP_RETRIES,
+            )
+    except scheduler.HostUnavailable:
+        if entry:
+            if archive.recording():
+                archive.current().put(url, entry['body'])
+            return _cached_result(cache, url, entry, parser, parse)
+        raise
+    if entry and (resp.status_code == 304 or resp.status_code in scheduler.THROTTLE_STATUSES):
+        if archive.recording():
+            archive.current().put(url, entry['body'])
+        return _cached_result(cache, url, entry, parser, parse, revalidated=resp.status_code == 304)
+    if archive.recording():
+        archive.current().put(url, resp.text, resp.status_code)
+    if resp.status_code != 200 or not resp.text:
+        return None
+
+    with metrics.stage('parse'):
+        result = parse(resp.text)
+    etag = resp.headers.get('ETag')
+    last_modified = resp.headers.get('Last-Modified')
+    if etag or last_modified:
+        try:
+            cache.put(url, {
+                'etag': etag,
+                'last_modified': last_modified,
+                'fetched_at': time.time(),
+                'body': resp.text,
+                'parsed': {parser: result},
+            })
+        except OSError:
+            pass
+    return result
@@ -0,0 +1,103 @@
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from db import get_db
+from store import init_store, load_reviews, refresh_reviews
+
+# Scrape jobs run on this many background threads per process.
+JOB_WORKERS = int(os.environ.get('SCRAPE_JOB_WORKERS', '4'))
+# A job still "queued"/"running" after this long is assumed lost (e.g. the
+# worker process died) and no longer blocks new jobs for the same slug.
+JOB_STALE_AFTER = 300
+
+_executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="scrape-job")
+
+
+def init_jobs(conn):
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS scrape_jobs (
+            id TEXT PRIMARY KEY,
+            slug TEXT NOT NULL,
+            max_reviews INTEGER NOT NULL,
+            status TEXT NOT NULL,
+            error TEXT,
+            created_at REAL NOT NULL,
+            updated_at REAL NOT NULL
+        )
+        """
+    )
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_scrape_jobs_slug ON scrape_jobs(slug, status)')
+
+
+def _set_status(job_id, status, error=None):
+    conn = get_db()
+    with conn:
+        conn.execute(
+            'UPDATE scrape_jobs SET status = ?, error = ?, updated_at = ? WHERE id = ?',
+            (status, error, time.time(), job_id),
+        )
+
+
+def _run(job_id, slug, max_reviews, fetch_fn):
+    _set_status(job_id, 'running')
+    try:
+        fetch_fn(slug, max_reviews)
+    except Exception as e:
+        _set_status(job_id, 'failed', str(e))
+    else:
+        _set_status(job_id, 'done')
+
+
+def submit_job(slug, max_reviews, fetch_fn=refresh_reviews):
+    """Queue a scrape+score job for slug and return its id.
+
+    If a live job for the same slug already covers max_reviews, its id is
+    returned instead of starting another scrape.
+    """
+    now = time.time()
+    conn = get_db()
+    init_jobs(conn)
+    init_store(conn)
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        row = conn.execute(
+            "SELECT id FROM scrape_jobs WHERE slug = ? AND status IN ('queued', 'running') "
+            "AND max_reviews >= ? AND updated_at > ? ORDER BY created_at DESC LIMIT 1",
+            (slug, int(max_reviews), now - JOB_STALE_AFTER),
+        ).fetchone()
+        if row:
+            conn.rollback()
+            return row['id']
+        job_id = uuid.uuid4().hex
+        conn.execute(
+            'INSERT INTO scrape_jobs (id, slug, max_reviews, status, error, created_at, updated_at) VALUES (?, ?, ?, ?, NULL, ?, ?)',
+            (job_id, slug, int(max_reviews), 'queued', now, now),
+        )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    _executor.submit(_run, job_id, slug, int(max_reviews), fetch_fn)
+    return job_id
+
+
+def get_job(job_id):
+    conn = get_db()
+    init_jobs(conn)
+    row = conn.execute(
+        'SELECT id, slug, max_reviews, status, error, created_at, updated_at FROM scrape_jobs WHERE id = ?',
+        (job_id,),
+    ).fetchone()
+    return dict(row) if row else None
+
+
+def job_result(job_id):
+    """Return the job row plus its scored reviews once the job is done."""
+    job = get_job(job_id)
+    if not job or job['status'] != 'done':
+        return job, None
+    rows = load_reviews(get_db(), job['slug'], limit=job['max_reviews'])
+    return job, rows
@@ -1,6 +1,6 @@
-import pandas as pd
+import archive
 from scraper import get_reviews
-from sentiment import analyze_sentiment
+from sentiment import analyze_sentiment_batch
 import os
 import argparse
 import sys
@@ -17,6 +17,8 @@ def name_to_slug(name):
     return name.replace(" ", "-").lower()
 
 def process_reviews(movie_slug, max_reviews=20):
+    import pandas as pd
+
     reviews = get_reviews(movie_slug, max_reviews=max_reviews)
     
     if not reviews:
@@ -24,8 +26,8 @@ def process_reviews(movie_slug, max_reviews=20):
         return pd.DataFrame()
 
     data = []
-    for review in reviews:
-        sentiment = analyze_sentiment(review)
+    for review, sentiment in zip(reviews, analyze_sentiment_batch(reviews)):
+        sentiment = float(sentiment)
         label = label_sentiment(sentiment)
         data.append({
             "Review": review,
@@ -42,8 +44,15 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Scrape Letterboxd reviews and analyze sentiment.")
     parser.add_argument("--movie", dest="movie", type=str, help="Movie name, e.g. 'The Dark Knight'", default=None)
     parser.add_argument("--max-reviews", dest="max_reviews", type=int, help="Maximum number of reviews to fetch", default=20)
+    parser.add_argument("--profile", action="store_true", help="Save a flame graph profile of the scrape to data/profiles/")
+    replay = parser.add_mutually_exclusive_group()
+    replay.add_argument("--record", metavar="ARCHIVE", nargs="?", const=archive.ARCHIVE_PATH, help="Save every scraped page to a scrape archive")
+    replay.add_argument("--replay", metavar="ARCHIVE", nargs="?", const=archive.ARCHIVE_PATH, help="Scrape from a recorded archive only (no network, no browser)")
     args = parser.parse_args()
 
+    if args.record or args.replay:
+        archive.configure("record" if args.record else "replay", args.record or args.replay)
+
     if args.movie:
         movie_name = args.movie
     else:
@@ -58,7 +67,15 @@ if __name__ == "__main__":
         sys.exit(1)
 
     movie_slug = name_to_slug(movie_name)
-    df = process_reviews(movie_slug, max_reviews=args.max_reviews)
+    profiler = None
+    if args.profile:
+        from profiling import Profiler
+        profiler = Profiler(label=f"main-{movie_slug}").start()
+    try:
+        df = process_reviews(movie_slug, max_reviews=args.max_reviews)
+    finally:
+        if profiler is not None:
+            print(f"Profile saved to: {profiler.stop()}")
 
     if df.empty:
         print("No data to display.")
@@ -0,0 +1,216 @@
+"""In-process metrics with Prometheus text exposition (no client library needed).
+
+Counters and fixed-bucket histograms are thread-safe and per process; under
+gunicorn -w N each worker reports its own numbers.
+"""
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+# Seconds; covers a cached 304 page parse up to a slow browser scrape.
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in pairs) + '}'
+
+
+def _num(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels[n]) for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(tuple(str(labels[n]) for n in self.labelnames), 0)
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return [(self.name + _labels(self.labelnames, key), value) for key, value in items]
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # key -> [per-bucket counts..., sum, count]
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels[n]) for n in self.labelnames)
+        with self._lock:
+            slot = self._values.get(key)
+            if slot is None:
+                slot = self._values[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    slot[i] += 1
+                    break
+            slot[-2] += value
+            slot[-1] += 1
+
+    def samples(self):
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._values.items())
+        out = []
+        for key, slot in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float('inf'),), slot[:-2] + [slot[-1] - sum(slot[:-2])]):
+                cumulative += n
+                out.append((f'{self.name}_bucket' + _labels(self.labelnames, key, [('le', _num(bound))]), cumulative))
+            out.append((f'{self.name}_sum' + _labels(self.labelnames, key), slot[-2]))
+            out.append((f'{self.name}_count' + _labels(self.labelnames, key), slot[-1]))
+        return out
+
+
+class Callback:
+    """A metric whose value is read from fn() at exposition time."""
+
+    def __init__(self, name, help, kind, fn):
+        self.name = name
+        self.help = help
+        self.kind = kind
+        self.fn = fn
+
+    def samples(self):
+        return [(self.name, self.fn())]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help, labelnames=()):
+        return self.register(Counter(name, help, labelnames))
+
+    def histogram(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def callback(self, name, help, kind, fn):
+        return self.register(Callback(name, help, kind, fn))
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for m in metrics:
+            try:
+                samples = m.samples()
+            except Exception:
+                # A broken callback should not take the whole endpoint down.
+                continue
+            lines.append(f'# HELP {m.name} {m.help}')
+            lines.append(f'# TYPE {m.name} {m.kind}')
+            lines.extend(f'{name} {_num(value)}' for name, value in samples)
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+STAGE_SECONDS = REGISTRY.histogram(
+    'stage_duration_seconds', 'Time spent per pipeline stage (fetch, parse, score, aggregate, render, write).', ('stage',)
+)
+SCRAPES = REGISTRY.counter('scrapes_total', 'Scrapes by the path that produced the reviews (fast = HTTP, browser = fallback).', ('path',))
+SCRAPE_FAILURES = REGISTRY.counter(
+    'scrape_failures_total', 'Failed scrapes by reason (unavailable = circuit open, error = raised, empty = no reviews).', ('reason',)
+)
+
+
+# Stage times are also added to the innermost collect() block of the
+# current context, so a caller can attribute them to one unit of work.
+_collector = contextvars.ContextVar('metrics_collector', default=None)
+
+
+class StageTimings:
+    def __init__(self):
+        self._totals = {}
+        self._lock = threading.Lock()
+
+    def add(self, stage, seconds):
+        with self._lock:
+            self._totals[stage] = self._totals.get(stage, 0.0) + seconds
+
+    def update(self, totals):
+        for stage, seconds in totals.items():
+            self.add(stage, seconds)
+
+    def get(self, stage, default=0.0):
+        return self._totals.get(stage, default)
+
+    def as_dict(self):
+        with self._lock:
+            return dict(self._totals)
+
+
+@contextmanager
+def collect(timings=None):
+    """Collect the stage times recorded inside this block (and in contexts copied from it).
+
+    Times are added to `timings` (a new StageTimings by default), which is yielded.
+    """
+    timings = StageTimings() if timings is None else timings
+    token = _collector.set(timings)
+    try:
+        yield timings
+    finally:
+        _collector.reset(token)
+
+
+def observe(stage, seconds):
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    timings = _collector.get()
+    if timings is not None:
+        timings.add(stage, seconds)
+
+
+@contextmanager
+def stage(name):
+    """Time the block into the stage histogram (and the active collector)."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start)
+
+
+def render():
+    return REGISTRY.render()
@@ -0,0 +1,102 @@
+import lxml.html
+
+
+def _has_class(name):
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+
+# One XPath union replacing the CSS selectors the scraper used to run one by one:
+#   .js-review .js-review-body, .js-review-body, .body-text.js-review-body,
+#   div.js-review div.body-text, article .body-text, [itemprop='reviewBody']
+# Two of those (".js-review .js-review-body" and ".body-text.js-review-body")
+# are subsets of ".js-review-body", so the union keeps the four distinct ones
+# and lxml returns every matching node once, in document order.
+REVIEW_XPATH = (
+    f"//*[{_has_class('js-review-body')}]"
+    f" | //div[{_has_class('js-review')}]//div[{_has_class('body-text')}]"
+    f" | //article//*[{_has_class('body-text')}]"
+    " | //*[@itemprop='reviewBody']"
+)
+
+# The same node set as a CSS selector, for use inside the browser.
+REVIEW_CSS = ".js-review-body, div.js-review div.body-text, article .body-text, [itemprop='reviewBody']"
+
+_find_review_nodes = lxml.html.etree.XPath(REVIEW_XPATH)
+
+
+def node_text(node):
+    # Same result as BeautifulSoup's get_text(strip=True): every text piece
+    # stripped and joined with no separator. Comments are skipped.
+    parts = []
+    for piece in node.xpath('.//text()'):
+        piece = piece.strip()
+        if piece:
+            parts.append(piece)
+    return ''.join(parts)
+
+
+def extract_review_texts(html):
+    """Return review body texts from a Letterboxd page in one pass.
+
+    The page is parsed with lxml's C parser (no BeautifulSoup tree) and the
+    review nodes are located with a single XPath query. Texts are deduped and
+    kept in page order.
+    """
+    if not html:
+        return []
+    try:
+        root = lxml.html.fromstring(html)
+    except (ValueError, lxml.html.etree.ParserError):
+        return []
+    texts = []
+    seen = set()
+    for node in _find_review_nodes(root):
+        txt = node_text(node)
+        if txt and txt not in seen:
+            seen.add(txt)
+            texts.append(txt)
+    return texts
+
+
+# Runs in the browser: returns texts of review nodes not returned by an earlier
+# call and marks them, so scroll iterations only extract appended reviews.
+_COLLECT_NEW_JS = """
+const out = [];
+for (const node of document.querySelectorAll(arguments[0])) {
+    if (node.dataset.rsSeen) continue;
+    node.dataset.rsSeen = '1';
+    const parts = [];
+    const walker = document.createTreeWalker(node, NodeFilter.SHOW_TEXT);
+    let t;
+    while ((t = walker.nextNode())) {
+        const s = t.nodeValue.trim();
+        if (s) parts.push(s);
+    }
+    if (parts.length) out.push(parts.join(''));
+}
+return out;
+"""
+
+
+class IncrementalExtractor:
+    """Pulls only newly appended reviews out of a live browser page.
+
+    Falls back to parsing page_source (and dropping already seen texts) if the
+    script cannot run.
+    """
+
+    def __init__(self, driver):
+        self.driver = driver
+        self.seen = set()
+
+    def collect(self):
+        try:
+            found = self.driver.execute_script(_COLLECT_NEW_JS, REVIEW_CSS) or []
+        except Exception:
+            found = extract_review_texts(self.driver.page_source)
+        fresh = []
+        for txt in found:
+            if txt not in self.seen:
+                self.seen.add(txt)
+                fresh.append(txt)
+        return fresh
@@ -0,0 +1,269 @@
+"""Per-host scheduling for scraper requests.
+
+Every request to a host goes through that host's HostScheduler, which
+combines:
+
+- a token bucket: SCRAPER_RATE requests/s with bursts of SCRAPER_BURST,
+  optionally shared by every process on the machine (SCRAPER_RATE_DB);
+- an adaptive concurrency limit (AIMD): it grows by one after `limit`
+  successes and halves on 429/5xx, at most once per second;
+- host-wide pauses: Retry-After, or exponential backoff when there is none,
+  holds back every request to the host, not just the one that was throttled;
+- a circuit breaker: after SCRAPER_BREAKER_THRESHOLD consecutive failures
+  requests fail fast with HostUnavailable for SCRAPER_BREAKER_COOLDOWN
+  seconds, then a single probe request decides whether the host is back.
+"""
+import email.utils
+import os
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+import metrics
+from db import connect
+
+RATE = float(os.environ.get('SCRAPER_RATE', '4'))
+BURST = float(os.environ.get('SCRAPER_BURST', '8'))
+MAX_CONCURRENCY = int(os.environ.get('SCRAPER_MAX_CONCURRENCY', '8'))
+BREAKER_THRESHOLD = int(os.environ.get('SCRAPER_BREAKER_THRESHOLD', '5'))
+BREAKER_COOLDOWN = float(os.environ.get('SCRAPER_BREAKER_COOLDOWN', '30'))
+# A Retry-After longer than this opens the breaker instead of being waited out.
+MAX_RETRY_WAIT = float(os.environ.get('SCRAPER_MAX_RETRY_WAIT', '30'))
+# How long a request may wait for its turn before giving up.
+ACQUIRE_TIMEOUT = float(os.environ.get('SCRAPER_ACQUIRE_TIMEOUT', '60'))
+BACKOFF = float(os.environ.get('SCRAPER_HTTP_BACKOFF', '0.5'))
+# SQLite file holding the token buckets, to share the rate limit between the
+# web workers and export runs on one machine. Empty = per process.
+RATE_DB = os.environ.get('SCRAPER_RATE_DB', '')
+
+THROTTLE_STATUSES = frozenset([429, 500, 502, 503, 504])
+
+THROTTLED = metrics.REGISTRY.counter('scraper_throttled_total', 'Responses that made the scheduler back off, per host and status.', ('host', 'status'))
+BREAKER_TRIPS = metrics.REGISTRY.counter('scraper_circuit_trips_total', 'Times a host circuit breaker opened.', ('host',))
+FAST_FAILS = metrics.REGISTRY.counter('scraper_fast_failures_total', 'Requests refused because the host circuit was open.', ('host',))
+
+
+class HostUnavailable(Exception):
+    """Raised instead of sending a request to the host.
+
+    reason is 'open' while its circuit is open (retry_in: seconds until a
+    probe is allowed) or 'timeout' when no request slot came free in time.
+    """
+
+    def __init__(self, host, retry_in, reason='open'):
+        if reason == 'open':
+            detail = f'circuit open, retry in {retry_in:.1f}s'
+        else:
+            detail = 'timed out waiting for a request slot'
+        super().__init__(f'{host} is unavailable ({detail})')
+        self.host = host
+        self.retry_in = retry_in
+        self.reason = reason
+
+
+def parse_retry_after(value, now=None):
+    """Seconds to wait from a Retry-After header (delta seconds or HTTP date), or None."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when is None:
+        return None
+    now = time.time() if now is None else now
+    return max(0.0, when.timestamp() - now)
+
+
+class TokenBucket:
+    """In-process token bucket."""
+
+    def __init__(self, rate, burst, clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self._tokens = burst
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def take(self):
+        """Take a token; returns 0, or the seconds until one is available (nothing taken)."""
+        with self._lock:
+            now = self.clock()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+
+class SQLiteTokenBucket:
+    """Token bucket kept in a SQLite file so every process on the host shares it."""
+
+    def __init__(self, path, key, rate, burst):
+        self.path = path
+        self.key = key
+        self.rate = rate
+        self.burst = burst
+        self._local = threading.local()
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS token_buckets (key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)'
+            )
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = self._local.conn = connect(self.path)
+        return conn
+
+    def take(self):
+        conn = self._conn()
+        now = time.time()
+        # BEGIN IMMEDIATE serializes the read-modify-write between processes.
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute('SELECT tokens, updated FROM token_buckets WHERE key = ?', (self.key,)).fetchone()
+            tokens = self.burst if row is None else min(self.burst, row['tokens'] + (now - row['updated']) * self.rate)
+            wait = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / self.rate
+            conn.execute('INSERT OR REPLACE INTO token_buckets (key, tokens, updated) VALUES (?, ?, ?)', (self.key, tokens, now))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return wait
+
+
+class HostScheduler:
+    def __init__(self, host, bucket, max_concurrency=MAX_CONCURRENCY, threshold=BREAKER_THRESHOLD,
+                 cooldown=BREAKER_COOLDOWN, max_retry_wait=MAX_RETRY_WAIT, backoff=BACKOFF, clock=time.monotonic):
+        self.host = host
+        self.bucket = bucket
+        self.max_concurrency = max_concurrency
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.max_retry_wait = max_retry_wait
+        self.backoff = backoff
+        self.clock = clock
+        self.limit = float(max_concurrency)
+        self.in_flight = 0
+        self.failures = 0
+        self.paused_until = 0.0
+        # Set while the breaker is open (until then) or half-open (time passed).
+        self.opened_until = None
+        self._last_decrease = float('-inf')
+        self._cond = threading.Condition()
+
+    def state(self):
+        with self._cond:
+            if self.opened_until is None:
+                return 'closed'
+            return 'open' if self.clock() < self.opened_until else 'half-open'
+
+    def acquire(self, timeout=ACQUIRE_TIMEOUT):
+        """Wait for a request slot. Raises HostUnavailable if the circuit is open ('open') or timeout passes ('timeout')."""
+        deadline = self.clock() + timeout
+        with self._cond:
+            while True:
+                now = self.clock()
+                if self.opened_until is not None and now < self.opened_until:
+                    FAST_FAILS.inc(host=self.host)
+                    raise HostUnavailable(self.host, self.opened_until - now)
+                # Half-open: a single probe at a time.
+                allowed = 1 if self.opened_until is not None else max(1, int(self.limit))
+                wait = self.paused_until - now
+                if wait <= 0 and self.in_flight < allowed:
+                    wait = self.bucket.take()
+                    if wait <= 0:
+                        self.in_flight += 1
+                        return
+                elif wait <= 0:
+                    wait = None  # woken by release()
+                if now >= deadline:
+                    raise HostUnavailable(self.host, 0, reason='timeout')
+                self._cond.wait(deadline - now if wait is None else min(wait, deadline - now))
+
+    def release(self, status=None, retry_after=None, error=False):
+        """Record how the request went. Returns True if it was throttled (429/5xx) or failed."""
+        with self._cond:
+            self.in_flight -= 1
+            now = self.clock()
+            failed = error or status in THROTTLE_STATUSES
+            if not failed:
+                self.failures = 0
+                self.opened_until = None
+                self.limit = min(float(self.max_concurrency), self.limit + 1 / self.limit)
+            else:
+                if status is not None:
+                    THROTTLED.inc(host=self.host, status=status)
+                self.failures += 1
+                if now - self._last_decrease >= 1.0:
+                    self.limit = max(1.0, self.limit / 2)
+                    self._last_decrease = now
+                wait = retry_after if retry_after is not None else self.backoff * 2 ** (self.failures - 1)
+                if (self.opened_until is not None or self.failures >= self.threshold
+                        or wait > self.max_retry_wait):
+                    self.opened_until = now + max(self.cooldown, wait)
+                    BREAKER_TRIPS.inc(host=self.host)
+                else:
+                    self.paused_until = max(self.paused_until, now + wait)
+            self._cond.notify_all()
+            return failed
+
+    @contextmanager
+    def slot(self, timeout=ACQUIRE_TIMEOUT):
+        """acquire()/release() around a request whose status is unknown (e.g. a browser load)."""
+        self.acquire(timeout)
+        failed = False
+        try:
+            yield
+        except Exception:
+            failed = True
+            raise
+        finally:
+            # Also runs when a generator holding the slot is closed early.
+            self.release(error=failed)
+
+    def request(self, send, retries=3):
+        """Call send() -> response in a slot, retrying 429/5xx after the host-wide pause.
+
+        Returns the last response (which may still be a 429/5xx once retries
+        run out). Raises HostUnavailable when the circuit is open.
+        """
+        for attempt in range(retries + 1):
+            self.acquire()
+            try:
+                resp = send()
+            except Exception:
+                self.release(error=True)
+                raise
+            retry_after = parse_retry_after(resp.headers.get('Retry-After'))
+            if not self.release(resp.status_code, retry_after) or attempt == retries:
+                return resp
+        return resp
+
+
+_schedulers = {}
+_schedulers_lock = threading.Lock()
+
+
+def for_url(url):
+    """The scheduler for url's host (one per process, created on first use)."""
+    host = urlsplit(url).netloc.lower()
+    with _schedulers_lock:
+        sched = _schedulers.get(host)
+        if sched is None:
+            bucket = SQLiteTokenBucket(RATE_DB, host, RATE, BURST) if RATE_DB else TokenBucket(RATE, BURST)
+            sched = _schedulers[host] = HostScheduler(host, bucket)
+        return sched
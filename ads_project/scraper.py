@@ -1,78 +1,245 @@
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import WebDriverException, NoSuchWindowException
-from webdriver_manager.chrome import ChromeDriverManager
-from bs4 import BeautifulSoup
-import time
+import contextvars
+import logging
 import os
-import requests
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import archive
+import metrics
+import scheduler
+from browser_pool import DRIVER_POOL, USER_AGENT
+from http_client import cached_get
+from review_extract import REVIEW_CSS, IncrementalExtractor, extract_review_texts
+
+# Overridable so scrapes can be pointed at a local stand-in server.
+BASE_URL = os.environ.get('LETTERBOXD_URL', 'https://letterboxd.com').rstrip('/')
+# Letterboxd shows this many reviews per listing page.
+REVIEWS_PER_PAGE = 12
+# Upper bound on listing pages fetched at once for a single scrape.
+MAX_PAGE_FETCHES = 8
+
+HEADERS = {
+    "User-Agent": USER_AGENT,
+    "Accept-Language": "en-US,en;q=0.9",
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,*/*;q=0.8",
+    "Connection": "keep-alive",
+}
+
+log = logging.getLogger(__name__)
+
+_page_executor = ThreadPoolExecutor(max_workers=MAX_PAGE_FETCHES, thread_name_prefix="review-page")
+
+
+def _page_url(url, page):
+    return url if page == 1 else f"{url}page/{page}/"
+
+
+def _fetch_page_reviews(url):
+    # Pooled session + conditional GET: an unchanged page comes back as 304
+    # and its previously parsed reviews are reused.
+    try:
+        return cached_get(url, extract_review_texts, headers=HEADERS, timeout=10) or []
+    except scheduler.HostUnavailable:
+        raise
+    except Exception:
+        return []
+
+
+def _fast_reviews(url, max_reviews, stop_at=None):
+    """Fetch listing pages concurrently over plain HTTP.
+
+    Pages are requested in waves sized to what is still missing and their
+    reviews yielded, deduped, in page order as soon as each page is in. A
+    wave that adds no new review ends the scrape (a server repeating its last
+    page would otherwise be paged through forever). The generator returns
+    stopped: whether stop_at matched a review.
+    """
+    seen = set()
+    page = 1
+    while len(seen) < max_reviews:
+        before = len(seen)
+        missing = max_reviews - len(seen)
+        count = min(MAX_PAGE_FETCHES, -(-missing // REVIEWS_PER_PAGE))
+        urls = [_page_url(url, p) for p in range(page, page + count)]
+        page += count
+        # Each page runs in a copy of our context so its fetch/parse times
+        # reach the caller's metrics.collect() block.
+        futures = [_page_executor.submit(contextvars.copy_context().run, _fetch_page_reviews, u) for u in urls]
+        for fut in futures:
+            try:
+                found = fut.result()
+            except scheduler.HostUnavailable:
+                # Keep what the earlier pages gave; with nothing, fail fast.
+                if seen:
+                    return False
+                raise
+            if not found:
+                # Ran past the last page (or the page failed); keep what we have.
+                return False
+            for txt in found:
+                if txt in seen:
+                    continue
+                if stop_at is not None and stop_at(txt):
+                    return True
+                seen.add(txt)
+                yield txt
+                if len(seen) >= max_reviews:
+                    return False
+        if len(seen) == before:
+            return False
+    return False
 
-def get_reviews(movie_slug, max_reviews=10, delay=2, fast=True, debug=False):
-    url = f"https://letterboxd.com/film/{movie_slug}/reviews/"
+
+def get_reviews(movie_slug, max_reviews=10, delay=2, fast=True, debug=False, newest=False, stop_at=None):
+    # newest=True reads the "recently added" ordering; stop_at is an optional
+    # predicate that ends the scrape at the first review it returns True for
+    # (used by incremental refreshes to stop at the first already-stored review).
+    # Raises scheduler.HostUnavailable, without trying the browser, while
+    # Letterboxd's circuit breaker is open.
+    return list(iter_reviews(movie_slug, max_reviews, delay, fast, debug, newest, stop_at))
+
+
+def iter_reviews(movie_slug, max_reviews=10, delay=2, fast=True, debug=False, newest=False, stop_at=None):
+    """get_reviews as a generator: reviews are yielded as soon as they are scraped.
+
+    The fast path yields a listing page's reviews once that page (and the
+    ones before it) is in, so the first results arrive after one page fetch;
+    the browser fallback yields after every scroll.
+    """
+    if newest:
+        url = f"{BASE_URL}/film/{movie_slug}/reviews/by/added/"
+    else:
+        url = f"{BASE_URL}/film/{movie_slug}/reviews/"
 
     # HTTP fast path (no browser). If fast mode is on, try HTTP first.
     if fast:
-        try:
-            headers = {
-                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-                "Accept-Language": "en-US,en;q=0.9",
-                "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,*/*;q=0.8",
-                "Connection": "keep-alive",
-            }
-            resp = requests.get(url, headers=headers, timeout=10)
-            if resp.status_code == 200 and resp.text:
-                soup = BeautifulSoup(resp.text, 'lxml')
-                texts = []
-                selectors = [
-                    ".js-review .js-review-body",
-                    ".js-review-body",
-                    ".body-text.js-review-body",
-                    "div.js-review div.body-text",
-                    "article .body-text",
-                    "[itemprop='reviewBody']",
-                ]
-                for sel in selectors:
-                    for node in soup.select(sel):
-                        txt = node.get_text(strip=True)
-                        if txt:
-                            texts.append(txt)
-                            if len(texts) >= max_reviews:
-                                break
-                    if len(texts) >= max_reviews:
-                        break
-                if texts:
-                    return texts[:max_reviews]
-        except Exception:
-            pass
+        found = 0
+        stopped = False
+        pages = _fast_reviews(url, max_reviews, stop_at)
+        while True:
+            try:
+                txt = next(pages)
+            except StopIteration as done:
+                stopped = done.value
+                break
+            except scheduler.HostUnavailable:
+                _scrape_failed(movie_slug, 'unavailable')
+                raise
+            except Exception:
+                break
+            found += 1
+            yield txt
+        # Once anything was yielded the browser cannot take over.
+        if found or stopped:
+            metrics.SCRAPES.inc(path='fast')
+            return
+
+    if archive.replaying():
+        yield from _replay_browser(url, max_reviews, stop_at)
+        return
 
-    options = Options()
-    options.add_argument("--headless=new")
-    options.add_argument("--disable-gpu")
-    options.add_argument("--window-size=1920,1080")
-    options.add_argument("--disable-blink-features=AutomationControlled")
-    options.add_argument(
-        "user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
-    )
-    options.add_experimental_option("excludeSwitches", ["enable-automation"]) 
-    options.add_experimental_option('useAutomationExtension', False)
+    # Browser fallback: borrow a warm Chrome from the pool instead of launching one.
+    metrics.SCRAPES.inc(path='browser')
+    found = 0
     try:
-        options.add_experimental_option("prefs", {
-            "profile.managed_default_content_settings.images": 2
-        })
+        with scheduler.for_url(url).slot(), DRIVER_POOL.driver() as driver:
+            for txt in _browser_reviews(driver, url, max_reviews, delay, fast, debug, stop_at):
+                found += 1
+                yield txt
     except Exception:
-        pass
+        _scrape_failed(movie_slug, 'error')
+        raise
+    if not found:
+        _scrape_failed(movie_slug, 'empty')
+
+
+def _scrape_failed(slug, reason):
+    # The slug comes from user input, so it is logged rather than used as a
+    # metric label (one series per string anyone submits).
+    metrics.SCRAPE_FAILURES.inc(reason=reason)
+    log.warning('scrape of %r failed: %s', slug, reason)
+
+
+def _replay_browser(url, max_reviews, stop_at):
+    # The final page_source of a recorded browser scrape, parsed the same way.
+    page = archive.current().get(url, source='browser')
+    if page is None:
+        return []
+    reviews = []
+    with metrics.stage('parse'):
+        found = extract_review_texts(page[1])
+    for txt in found:
+        if stop_at is not None and stop_at(txt):
+            break
+        reviews.append(txt)
+        if len(reviews) >= max_reviews:
+            break
+    return reviews
+
+
+# Poll interval for the browser waits below.
+WAIT_POLL = 0.1
+
+# Clicks every "More" link that expands a truncated review.
+_EXPAND_MORE_JS = """
+for (const a of document.querySelectorAll('a')) {
+    if ((a.textContent || '').indexOf('More') !== -1) {
+        try { a.click(); } catch (e) {}
+    }
+}
+"""
+
+_PAGE_STATE_JS = "return [document.querySelectorAll(arguments[0]).length, document.body.scrollHeight];"
+
+
+def _page_state(driver):
+    count, height = driver.execute_script(_PAGE_STATE_JS, REVIEW_CSS)
+    return count, height
+
+
+def _wait_for_more(driver, state, timeout):
+    """Wait after a scroll until new reviews appear or the page stops growing.
+
+    Returns the latest (review_count, scroll_height). Returns early when the
+    review count rises, or when the height has changed and then held steady
+    for two polls; otherwise gives up after timeout seconds.
+    """
+    latest = [state]
+    steady = [0]
+
+    def progressed(d):
+        current = _page_state(d)
+        if current[0] > state[0]:
+            latest[0] = current
+            return True
+        if current[1] != state[1] and current[1] == latest[0][1]:
+            steady[0] += 1
+        else:
+            steady[0] = 0
+        latest[0] = current
+        return steady[0] >= 2
+
+    from selenium.common.exceptions import TimeoutException
+    from selenium.webdriver.support.ui import WebDriverWait
+
     try:
-        options.page_load_strategy = 'eager'
-    except Exception:
+        WebDriverWait(driver, timeout, poll_frequency=WAIT_POLL).until(progressed)
+    except TimeoutException:
         pass
+    return latest[0]
 
-    service = Service(ChromeDriverManager().install())
-    driver = webdriver.Chrome(service=service, options=options)
 
+def _browser_reviews(driver, url, max_reviews, delay, fast, debug, stop_at):
+    # Yields every review as soon as it is collected from the page.
+    # Selenium is only imported once a scrape actually needs the browser.
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.common.exceptions import WebDriverException, NoSuchWindowException
+
+    stopped = False
+
+    fetch_start = time.perf_counter()
     driver.get(url)
     try:
         WebDriverWait(driver, 5 if fast else 12).until(EC.presence_of_element_located((By.TAG_NAME, "body")))
@@ -100,114 +267,89 @@ def get_reviews(movie_slug, max_reviews=10, delay=2, fast=True, debug=False):
     except Exception:
         pass
 
-    # Try to expand any truncated reviews
+    reviews = []
+    # Wait for at least one review area to be present if possible; returns as
+    # soon as one shows up instead of sleeping a fixed delay.
+    try:
+        WebDriverWait(driver, 4 if fast else 8, poll_frequency=WAIT_POLL).until(
+            EC.presence_of_any_elements_located((By.CSS_SELECTOR, ".review, .review .review-text, section.review, [itemprop='reviewBody'], .js-review-body"))
+        )
+    except Exception:
+        pass
+    metrics.observe('fetch', time.perf_counter() - fetch_start)
+
+    # Expand every truncated review in a single script call
     if not fast:
         try:
-            more_buttons = driver.find_elements(By.PARTIAL_LINK_TEXT, "More")
-            for btn in more_buttons[:10]:
-                try:
-                    btn.click()
-                    time.sleep(0.2)
-                except Exception:
-                    continue
+            driver.execute_script(_EXPAND_MORE_JS)
         except Exception:
             pass
 
-    time.sleep(max(1, delay))
-
-    os.makedirs("data", exist_ok=True)
-    try:
-        html = driver.page_source
-        if debug:
+    if debug:
+        os.makedirs("data", exist_ok=True)
+        try:
+            html = driver.page_source
             driver.save_screenshot(os.path.join("data", "page.png"))
             with open(os.path.join("data", "last_page.html"), "w", encoding="utf-8") as f:
                 f.write(html)
-    except (WebDriverException, NoSuchWindowException):
-        try:
-            driver.quit()
-        except Exception:
-            pass
-        return []
-
-    try:
-        soup = BeautifulSoup(html, 'lxml')
-    except Exception:
-        driver.quit()
-        return []
-    reviews = []
-
-    def extract_reviews(curr_soup):
-        texts = []
-        selectors = [
-            ".js-review .js-review-body",
-            ".js-review-body",
-            ".body-text.js-review-body",
-            "div.js-review div.body-text",
-            "article .body-text",
-            "[itemprop='reviewBody']",
-        ]
-        for sel in selectors:
-            for node in curr_soup.select(sel):
-                txt = node.get_text(strip=True)
-                if txt:
-                    texts.append(txt)
-        if debug:
-            try:
-                print("Selector matches:")
-                for sel in selectors:
-                    print(sel, len(curr_soup.select(sel)))
-            except Exception:
-                pass
-        return texts
+            print("Review nodes matched:", len(extract_review_texts(html)))
+        except (WebDriverException, NoSuchWindowException):
+            return
 
-    seen = set()
-    # Wait for at least one review area to be present if possible
+    # Each collect() returns only review nodes added since the previous call,
+    # so scrolling never re-parses reviews we already have.
+    extractor = IncrementalExtractor(driver)
     try:
-        WebDriverWait(driver, 4 if fast else 8).until(
-            EC.presence_of_any_elements_located((By.CSS_SELECTOR, ".review, .review .review-text, section.review, [itemprop='reviewBody'], .js-review-body"))
-        )
-    except Exception:
-        pass
-
-    for txt in extract_reviews(soup):
-        if txt not in seen:
-            seen.add(txt)
-            reviews.append(txt)
+        with metrics.stage('parse'):
+            found = extractor.collect()
+    except (WebDriverException, NoSuchWindowException):
+        return
+    for txt in found:
+        if stop_at is not None and stop_at(txt):
+            stopped = True
+            break
+        reviews.append(txt)
+        yield txt
         if len(reviews) >= max_reviews:
             break
 
-    if not fast and len(reviews) < max_reviews:
+    if not fast and not stopped and len(reviews) < max_reviews:
         try:
-            last_height = driver.execute_script("return document.body.scrollHeight")
+            state = _page_state(driver)
         except (WebDriverException, NoSuchWindowException):
-            last_height = None
+            state = None
         retries = 0
-        while len(reviews) < max_reviews and retries < 6:
+        while state is not None and len(reviews) < max_reviews and retries < 3:
             try:
-                driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-                time.sleep(max(1, delay // 2))
-                new_height = driver.execute_script("return document.body.scrollHeight")
+                with metrics.stage('fetch'):
+                    driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
+                    new_state = _wait_for_more(driver, state, timeout=max(1, delay // 2))
             except (WebDriverException, NoSuchWindowException):
                 break
-            if new_height == last_height:
-                retries += 1
-            else:
+            if new_state != state:
                 retries = 0
-            last_height = new_height
+            else:
+                retries += 1
+            state = new_state
             try:
-                html = driver.page_source
+                driver.execute_script(_EXPAND_MORE_JS)
+                with metrics.stage('parse'):
+                    found = extractor.collect()
             except (WebDriverException, NoSuchWindowException):
                 break
-            soup = BeautifulSoup(html, 'lxml')
-            for txt in extract_reviews(soup):
-                if txt not in seen:
-                    seen.add(txt)
-                    reviews.append(txt)
+            for txt in found:
+                if stop_at is not None and stop_at(txt):
+                    stopped = True
+                    break
+                reviews.append(txt)
+                yield txt
                 if len(reviews) >= max_reviews:
                     break
+            if stopped:
+                break
 
-    try:
-        driver.quit()
-    except Exception:
-        pass
-    return reviews
\ No newline at end of file
+    if archive.recording():
+        try:
+            archive.current().put(url, driver.page_source, source='browser')
+        except (WebDriverException, NoSuchWindowException):
+            pass
\ No newline at end of file
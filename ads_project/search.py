@@ -0,0 +1,157 @@
+import re
+
+LABELS = ('Positive', 'Neutral', 'Negative')
+SORTS = ('rank', 'score_desc', 'score_asc')
+MAX_PAGE = 100
+
+# sort -> expression the page is ordered (and keyset-compared) by; ties are
+# broken by rowid so every row has a unique position.
+_SORT_KEYS = {
+    'rank': 'rank',
+    'score_desc': '-score',
+    'score_asc': 'score',
+}
+_TERM_RE = re.compile(r'\S+')
+
+_COLUMNS = 'review, slug_key, label, slug, score, content_hash'
+_NEW_ROW = 'new.review, hex(new.slug), new.label, new.slug, new.score, new.content_hash'
+_DELETE_OLD = (
+    'DELETE FROM reviews_fts WHERE rowid IN ('
+    "SELECT rowid FROM reviews_fts WHERE reviews_fts MATCH 'slug_key : \"' || hex(old.slug) || '\"'"
+    ') AND content_hash = old.content_hash'
+)
+
+
+def init_search(conn):
+    """FTS5 index over the reviews table, kept in sync by triggers.
+
+    The movie (as the hex of its slug, a single token) and the label are
+    indexed columns, so filtering on them intersects posting lists instead
+    of checking every match. The index holds its own copy of each review
+    with slug and score unindexed, so searches never join back to reviews
+    and do not depend on reviews' rowids, which VACUUM may renumber.
+    """
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'reviews_fts'").fetchone()
+    if exists:
+        return
+    with conn:
+        conn.execute(
+            """
+            CREATE VIRTUAL TABLE reviews_fts USING fts5(
+                review,
+                slug_key,
+                label,
+                slug UNINDEXED,
+                score UNINDEXED,
+                content_hash UNINDEXED,
+                tokenize = 'unicode61 remove_diacritics 2'
+            )
+            """
+        )
+        conn.execute(
+            f'CREATE TRIGGER IF NOT EXISTS reviews_fts_insert AFTER INSERT ON reviews BEGIN '
+            f'INSERT INTO reviews_fts ({_COLUMNS}) VALUES ({_NEW_ROW}); END'
+        )
+        conn.execute(f'CREATE TRIGGER IF NOT EXISTS reviews_fts_delete AFTER DELETE ON reviews BEGIN {_DELETE_OLD}; END')
+        conn.execute(
+            f'CREATE TRIGGER IF NOT EXISTS reviews_fts_update AFTER UPDATE ON reviews BEGIN '
+            f'{_DELETE_OLD}; INSERT INTO reviews_fts ({_COLUMNS}) VALUES ({_NEW_ROW}); END'
+        )
+        # Reviews stored before the index existed.
+        conn.execute(
+            f'INSERT INTO reviews_fts ({_COLUMNS}) '
+            'SELECT review, hex(slug), label, slug, score, content_hash FROM reviews'
+        )
+
+
+def remove_movie_index(conn, slug):
+    """Drop slug's reviews from the index ahead of deleting all of them (in the same transaction).
+
+    The delete trigger then finds nothing to remove for each review, instead
+    of scanning the movie's remaining index rows once per review.
+    """
+    conn.execute(
+        'DELETE FROM reviews_fts WHERE rowid IN ('
+        "SELECT rowid FROM reviews_fts WHERE reviews_fts MATCH 'slug_key : \"' || hex(?) || '\"')",
+        (slug,),
+    )
+
+
+def fts_query(text: str) -> str:
+    """Turn user input into an FTS5 query: every word must appear.
+
+    Words are quoted so punctuation and FTS operators in the input are taken
+    literally; a trailing * (e.g. "cill*") is kept as a prefix search.
+    """
+    parts = []
+    for word in _TERM_RE.findall(text):
+        prefix = word.endswith('*')
+        word = word.rstrip('*')
+        if word:
+            parts.append('"' + word.replace('"', '""') + '"' + ('*' if prefix else ''))
+    return ' '.join(parts)
+
+
+def _encode_cursor(key, rowid):
+    return f'{key!r}:{rowid}'
+
+
+def _decode_cursor(cursor):
+    try:
+        key, rowid = cursor.rsplit(':', 1)
+        return float(key), int(rowid)
+    except (AttributeError, ValueError):
+        raise ValueError('invalid cursor')
+
+
+def search_reviews(conn, query, slug=None, label=None, sort='rank', limit=20, cursor=None):
+    """Full-text search over stored reviews.
+
+    Returns (rows, next_cursor); rows are dicts with slug, review, score,
+    label and rank (bm25, lower is better). Pass next_cursor back to get the
+    following page; it is None on the last page. Raises ValueError for an
+    empty query, unknown sort/label or a malformed cursor.
+    """
+    match = fts_query(query or '')
+    if not match:
+        raise ValueError('query is empty')
+    if sort not in _SORT_KEYS:
+        raise ValueError(f'sort must be one of {", ".join(SORTS)}')
+    if label is not None and label not in LABELS:
+        raise ValueError(f'label must be one of {", ".join(LABELS)}')
+    limit = min(max(int(limit), 1), MAX_PAGE)
+    key = _SORT_KEYS[sort]
+
+    match = f'review : ({match})'
+    if slug:
+        match += f' AND slug_key : "{slug.encode("utf-8").hex()}"'
+    if label:
+        match += f' AND label : "{label}"'
+    # Only the review column counts towards relevance.
+    sql = (
+        'SELECT * FROM ('
+        'SELECT rowid AS id, slug, review, score, label, bm25(reviews_fts, 1.0, 0.0, 0.0) AS rank '
+        'FROM reviews_fts WHERE reviews_fts MATCH ?'
+        ')'
+    )
+    params = [match]
+    if cursor:
+        after_key, after_id = _decode_cursor(cursor)
+        sql += f' WHERE ({key}, id) > (?, ?)'
+        params += [after_key, after_id]
+    sql += f' ORDER BY {key}, id LIMIT ?'
+    params.append(limit + 1)
+
+    rows = conn.execute(sql, params).fetchall()
+    more = len(rows) > limit
+    rows = rows[:limit]
+    results = [
+        {'slug': r['slug'], 'review': r['review'], 'score': r['score'], 'label': r['label'], 'rank': r['rank']}
+        for r in rows
+    ]
+    next_cursor = None
+    if more:
+        last = rows[-1]
+        sort_value = {'rank': last['rank'], 'score_desc': -last['score'], 'score_asc': last['score']}[sort]
+        next_cursor = _encode_cursor(sort_value, last['id'])
+    return results, next_cursor
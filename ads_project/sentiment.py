@@ -1,12 +1,18 @@
+import json
+import os
 import re
-import nltk
-from nltk.sentiment.vader import SentimentIntensityAnalyzer
+import threading
 
-nltk.download('vader_lexicon', quiet=True)
-sid = SentimentIntensityAnalyzer()
+# Precompiled lexicon: VADER's stock lexicon with LEXICON_TWEAKS applied,
+# stored as JSON so startup needs neither nltk_data nor the network.
+# Rebuild with: python sentiment.py --build-lexicon
+LEXICON_CACHE = os.environ.get(
+    'VADER_LEXICON_CACHE',
+    os.path.join(os.path.dirname(__file__), 'data', 'vader_lexicon_movies.json'),
+)
 
 # Custom lexicon tweaks to better reflect movie review language
-sid.lexicon.update({
+LEXICON_TWEAKS = {
     # Strong positive phrases mapped via preprocessing
     'deeply_moving': 3.0,
     'profoundly_touching': 3.0,
@@ -17,7 +23,68 @@ sid.lexicon.update({
     'masterpiece': 3.2,
     # Reduce negative pull from words that can appear in positive contexts
     'cry': 0.0,
-})
+}
+
+_sid = None
+_sid_lock = threading.Lock()
+
+
+def _stock_lexicon():
+    # Only reached when the precompiled cache is missing.
+    import nltk
+    from nltk.sentiment.vader import SentimentIntensityAnalyzer
+    try:
+        return SentimentIntensityAnalyzer().lexicon
+    except LookupError:
+        nltk.download('vader_lexicon', quiet=True)
+        return SentimentIntensityAnalyzer().lexicon
+
+
+def build_lexicon_cache(path=LEXICON_CACHE):
+    lexicon = dict(_stock_lexicon())
+    lexicon.update(LEXICON_TWEAKS)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump({'tweaks': LEXICON_TWEAKS, 'lexicon': lexicon}, f, ensure_ascii=False, sort_keys=True)
+    os.replace(tmp, path)
+    return lexicon
+
+
+def _load_lexicon():
+    try:
+        with open(LEXICON_CACHE, 'r', encoding='utf-8') as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        return build_lexicon_cache()
+    lexicon = cached['lexicon']
+    if cached.get('tweaks') != LEXICON_TWEAKS:
+        lexicon.update(LEXICON_TWEAKS)
+    return lexicon
+
+
+def get_analyzer():
+    """The process-wide VADER analyzer, created on first use."""
+    global _sid
+    if _sid is None:
+        with _sid_lock:
+            if _sid is None:
+                from nltk.sentiment.vader import VaderConstants
+                from vader_fast import FastAnalyzer
+                # Bypass __init__, which would read the lexicon from nltk_data.
+                analyzer = FastAnalyzer.__new__(FastAnalyzer)
+                analyzer.lexicon = _load_lexicon()
+                analyzer.constants = VaderConstants()
+                _sid = analyzer
+    return _sid
+
+
+def __getattr__(name):
+    # Keep `sentiment.sid` working without building the analyzer at import time.
+    if name == 'sid':
+        return get_analyzer()
+    raise AttributeError(name)
+
 
 PHRASE_MAP = [
     (r"\bnever fails to make me cry\b", 'deeply_moving'),
@@ -28,13 +95,55 @@ PHRASE_MAP = [
     (r"\bmust[- ]watch\b", 'must_watch'),
 ]
 
+# All phrase rewrites merged into a single alternation so each review is
+# scanned once. The patterns never overlap, so this gives the same result
+# as applying PHRASE_MAP pass by pass.
+_PHRASE_RE = re.compile('|'.join(f'(?P<p{i}>{pat})' for i, (pat, _) in enumerate(PHRASE_MAP)))
+_PHRASE_TOKENS = {f'p{i}': token for i, (_, token) in enumerate(PHRASE_MAP)}
+
+
+def _replace_phrase(match):
+    return _PHRASE_TOKENS[match.lastgroup]
+
+
 def _preprocess(text: str) -> str:
-    t = text.lower()
-    for pat, token in PHRASE_MAP:
-        t = re.sub(pat, token, t)
-    return t
+    return _PHRASE_RE.sub(_replace_phrase, text.lower())
+
 
 def analyze_sentiment(text):
     processed = _preprocess(text)
-    score = sid.polarity_scores(processed)
-    return score['compound']
\ No newline at end of file
+    score = get_analyzer().polarity_scores(processed)
+    return score['compound']
+
+
+def analyze_sentiment_batch(texts):
+    """Score many reviews at once and return a float64 array of compound scores.
+
+    Accepts any iterable of strings; results match analyze_sentiment exactly.
+    Most of the gain over scoring with stock nltk comes from the analyzer
+    (vader_fast, ~3x on distinct reviews, also used by analyze_sentiment);
+    on top of that identical reviews (after lowercasing) are scored once,
+    which only helps inputs with repeats.
+    """
+    import numpy as np
+
+    sub = _PHRASE_RE.sub
+    polarity = get_analyzer().polarity_scores
+    memo = {}
+    scores = []
+    append = scores.append
+    for text in texts:
+        t = text.lower()
+        score = memo.get(t)
+        if score is None:
+            score = polarity(sub(_replace_phrase, t))['compound']
+            memo[t] = score
+        append(score)
+    return np.fromiter(scores, dtype=np.float64, count=len(scores))
+
+
+if __name__ == '__main__':
+    import sys
+
+    if '--build-lexicon' in sys.argv:
+        print(f"Wrote {len(build_lexicon_cache())} lexicon entries to {LEXICON_CACHE}")
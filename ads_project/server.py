@@ -1,18 +1,26 @@
+import hmac
+import json
 import os
 import sqlite3
 import socket
-import time
+import threading
 import requests
-from flask import Flask, render_template, request, redirect, url_for, flash
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, wait
+from flask import Flask, Response, g, render_template, request, redirect, stream_with_context, url_for, flash, jsonify
 from flask_login import LoginManager, login_user, login_required, logout_user, UserMixin, current_user
 from werkzeug.security import generate_password_hash, check_password_hash
 
-from main import name_to_slug, label_sentiment
-from scraper import get_reviews
-from sentiment import analyze_sentiment
-import pandas as pd
-
-DB_PATH = os.path.join(os.path.dirname(__file__), 'app.db')
+import metrics
+import profiling
+from aggregates import movie_summary
+from cache import MemoryBackend, ReviewCache, SQLiteBackend
+from db import RowCache, get_db, end_request
+from jobs import init_jobs, submit_job, get_job, job_result
+from main import name_to_slug
+from search import LABELS, SORTS, search_reviews
+from store import init_store, refresh_reviews, stream_reviews
+from terms import top_terms
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-secret-key')
@@ -20,19 +28,33 @@ app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-secret-key')
 login_manager = LoginManager(app)
 login_manager.login_view = 'login'
 
-# --- Simple in-memory cache ---
-CACHE = {}
+# --- In-memory review cache (LRU + TTL, single-flight per slug) ---
 CACHE_TTL = 600
+CACHE_NEGATIVE_TTL = 60
+CACHE_MAX_ENTRIES = 256
+# REVIEW_CACHE_BACKEND=sqlite shares the cache (and the per-slug scrape lock)
+# between all worker processes on the host, e.g. under gunicorn -w N.
+CACHE_BACKEND = os.environ.get('REVIEW_CACHE_BACKEND', 'memory')
+CACHE_DB_PATH = os.environ.get('REVIEW_CACHE_DB', os.path.join(os.path.dirname(__file__), 'data', 'review_cache.db'))
+
+
+def _make_cache_backend():
+    if CACHE_BACKEND == 'sqlite':
+        return SQLiteBackend(CACHE_DB_PATH)
+    return MemoryBackend()
+
+
+CACHE = ReviewCache(
+    maxsize=CACHE_MAX_ENTRIES, ttl=CACHE_TTL, negative_ttl=CACHE_NEGATIVE_TTL,
+    backend=_make_cache_backend(),
+)
+
+metrics.REGISTRY.callback('review_cache_hits_total', 'Review cache lookups answered from the cache.', 'counter', lambda: CACHE.hits)
+metrics.REGISTRY.callback('review_cache_misses_total', 'Review cache lookups that had to fetch.', 'counter', lambda: CACHE.misses)
+metrics.REGISTRY.callback('review_cache_evictions_total', 'Review cache entries evicted by the LRU bound.', 'counter', lambda: CACHE.evictions)
 
 def get_cached_reviews(slug: str, max_reviews: int, fetch_fn):
-    now = time.time()
-    key = (slug, int(max_reviews))
-    entry = CACHE.get(key)
-    if entry and now - entry['ts'] < CACHE_TTL:
-        return entry['data']
-    texts = fetch_fn()
-    CACHE[key] = {'ts': now, 'data': texts}
-    return texts
+    return CACHE.get(slug, max_reviews, fetch_fn)
 
 # --- User model using SQLite ---
 class User(UserMixin):
@@ -42,10 +64,15 @@ class User(UserMixin):
         self.password_hash = password_hash
 
 
-def get_db():
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
+# Hot-path lookups (the user row on every authenticated request, settings)
+# are served from memory; writes in this process invalidate them.
+USER_CACHE = RowCache(ttl=60)
+SETTINGS_CACHE = RowCache(ttl=60)
+
+
+@app.teardown_appcontext
+def _end_db_request(exc):
+    end_request()
 
 
 def init_db():
@@ -68,6 +95,8 @@ def init_db():
             )
             """
         )
+        init_store(conn)
+        init_jobs(conn)
         # Seed a public demo URL if none present
         row_url = conn.execute('SELECT value FROM settings WHERE key = ?', ('POWERBI_EMBED_URL',)).fetchone()
         if not row_url or not (row_url['value'] or '').strip():
@@ -80,30 +109,66 @@ def init_db():
             conn.execute('INSERT INTO users (username, password_hash) VALUES (?, ?)', (
                 'demo', generate_password_hash('demo123')
             ))
-    conn.close()
 
 
 @login_manager.user_loader
 def load_user(user_id):
-    conn = get_db()
-    row = conn.execute('SELECT id, username, password_hash FROM users WHERE id = ?', (user_id,)).fetchone()
-    conn.close()
+    def fetch():
+        row = get_db().execute('SELECT id, username, password_hash FROM users WHERE id = ?', (user_id,)).fetchone()
+        return tuple(row) if row else None
+    row = USER_CACHE.get(str(user_id), fetch)
     if row:
-        return User(row['id'], row['username'], row['password_hash'])
+        return User(*row)
     return None
 
 def get_setting(key: str, default: str = "") -> str:
-    conn = get_db()
-    row = conn.execute('SELECT value FROM settings WHERE key = ?', (key,)).fetchone()
-    conn.close()
-    return row['value'] if row and row['value'] is not None else default
+    def fetch():
+        row = get_db().execute('SELECT value FROM settings WHERE key = ?', (key,)).fetchone()
+        return row['value'] if row else None
+    value = SETTINGS_CACHE.get(key, fetch)
+    return value if value is not None else default
 
 
 def set_setting(key: str, value: str) -> None:
     conn = get_db()
     with conn:
         conn.execute('INSERT INTO settings(key, value) VALUES(?, ?) ON CONFLICT(key) DO UPDATE SET value=excluded.value', (key, value))
-    conn.close()
+    SETTINGS_CACHE.invalidate(key)
+
+
+# --- Opt-in profiling of single requests ---
+# An operator sends "X-Profile: <token>" (or ?profile=<token>) where the token
+# matches the PROFILE_TOKEN setting; the thread serving that request is
+# sampled (not other requests or pool threads; compare's scrapes show up as
+# the wait for them) and its flame graph is saved to data/profiles/.
+# Requests without the flag skip this after one header lookup.
+PROFILED_ENDPOINTS = {'dashboard', 'compare'}
+
+
+@app.before_request
+def _start_profile():
+    flag = request.headers.get('X-Profile') or request.args.get('profile')
+    if not flag or request.endpoint not in PROFILED_ENDPOINTS:
+        return
+    token = get_setting('PROFILE_TOKEN')
+    if token and hmac.compare_digest(flag.encode('utf-8'), token.encode('utf-8')):
+        g.profiler = profiling.Profiler(label=request.endpoint, threads=[threading.get_ident()]).start()
+
+
+@app.after_request
+def _save_profile(response):
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        response.headers['X-Profile-File'] = os.path.basename(profiler.stop())
+    return response
+
+
+@app.teardown_request
+def _stop_profile(exc):
+    # after_request is skipped when the view raised.
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        profiler.stop()
 
 
 @app.route('/')
@@ -126,12 +191,11 @@ def signup():
             conn = get_db()
             with conn:
                 conn.execute('INSERT INTO users (username, password_hash) VALUES (?, ?)', (email, pw_hash))
+            USER_CACHE.invalidate()
             flash('Account created. Please sign in.', 'success')
             return redirect(url_for('login'))
         except sqlite3.IntegrityError:
             flash('User already exists.', 'danger')
-        finally:
-            conn.close()
     return render_template('signup.html')
 
 
@@ -140,9 +204,7 @@ def login():
     if request.method == 'POST':
         email = request.form.get('username', '').strip()
         password = request.form.get('password', '').strip()
-        conn = get_db()
-        row = conn.execute('SELECT id, username, password_hash FROM users WHERE username = ?', (email,)).fetchone()
-        conn.close()
+        row = get_db().execute('SELECT id, username, password_hash FROM users WHERE username = ?', (email,)).fetchone()
         if row and check_password_hash(row['password_hash'], password):
             user = User(row['id'], row['username'], row['password_hash'])
             login_user(user)
@@ -160,9 +222,7 @@ def logout():
 
 @app.route('/demo')
 def demo_login():
-    conn = get_db()
-    row = conn.execute('SELECT id, username, password_hash FROM users WHERE username = ?', ('demo',)).fetchone()
-    conn.close()
+    row = get_db().execute('SELECT id, username, password_hash FROM users WHERE username = ?', ('demo',)).fetchone()
     if row:
         user = User(row['id'], row['username'], row['password_hash'])
         login_user(user)
@@ -176,6 +236,7 @@ def demo_login():
 def dashboard():
     results = None
     summary = None
+    stats = None
     movie_name = ''
     if request.method == 'POST':
         movie_name = request.form.get('movie', '').strip()
@@ -190,75 +251,281 @@ def dashboard():
         else:
             slug = name_to_slug(movie_name)
             try:
-                texts = get_cached_reviews(slug, max_reviews, lambda: get_reviews(slug, max_reviews=max_reviews, delay=1, fast=True, debug=False))
+                data = get_cached_reviews(slug, max_reviews, lambda: refresh_reviews(slug, max_reviews))
             except Exception as e:
-                texts = []
+                data = []
                 flash(f'Error fetching reviews: {e}', 'danger')
-            if not texts:
+            if not data:
                 flash('No reviews found. Try adding year, e.g., "Barbie 2023".', 'info')
             else:
-                data = []
-                for t in texts:
-                    score = analyze_sentiment(t)
-                    label = label_sentiment(score)
-                    data.append({'review': t, 'score': score, 'label': label})
-                df = pd.DataFrame(data)
-                counts = df['label'].value_counts()
-                summary = counts.to_dict()
+                # The summary covers the reviews fetched for this request;
+                # stats (every review stored for the movie) is shown apart.
+                with metrics.stage('aggregate'):
+                    summary = _label_counts(data)
+                    stats = movie_summary(get_db(), slug)
                 # show only first 10 reviews in UI
-                results = df.head(10).to_dict(orient='records')
-    return render_template('dashboard.html', movie_name=movie_name, results=results, summary=summary)
+                results = data[:10]
+    return _render('dashboard.html', movie_name=movie_name, results=results, summary=summary, stats=stats,
+                   fetched=len(data) if results else 0)
+
+
+def _sse(event, data):
+    return f'event: {event}\ndata: {json.dumps(data)}\n\n'
+
+
+@app.route('/dashboard/stream')
+@login_required
+def dashboard_stream():
+    """Server-Sent Events version of the dashboard.
+
+    Sends a "review" event per review as soon as it is scraped and scored,
+    with the running label counts, then a final "summary" event (or "error")
+    whose summary counts the streamed reviews and whose stats cover every
+    review stored for the movie.
+    """
+    movie_name = (request.args.get('movie') or '').strip()
+    try:
+        max_reviews = int(request.args.get('max_reviews') or 10)
+    except ValueError:
+        max_reviews = 10
+    max_reviews = min(max(max_reviews, 1), 50)
+    if not movie_name:
+        return jsonify({'error': 'movie is required'}), 400
+    slug = name_to_slug(movie_name)
+
+    def events():
+        counts = Counter()
+        n = 0
+        try:
+            for row in stream_reviews(slug, max_reviews):
+                n += 1
+                counts[row['label']] += 1
+                yield _sse('review', {'n': n, **row, 'counts': dict(counts.most_common())})
+        except Exception as e:
+            yield _sse('error', {'message': f'Error fetching reviews: {e}'})
+            return
+        # The store has changed under whatever the cache holds for this movie.
+        CACHE.invalidate(slug)
+        with metrics.stage('aggregate'):
+            stats = movie_summary(get_db(), slug) if n else None
+        yield _sse('summary', {
+            'total': n,
+            'summary': dict(counts.most_common()),
+            'stats': stats,
+        })
+
+    return Response(
+        stream_with_context(events()), mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
+
+
+def _render(template, **context):
+    with metrics.stage('render'):
+        return render_template(template, **context)
+
+
+def _label_counts(rows):
+    # Counts for exactly the rows shown, most frequent first.
+    return dict(Counter(r['label'] for r in rows).most_common())
+
+
+# --- Compare: any number of movies, fetched concurrently ---
+MAX_COMPARE_MOVIES = 6
+# Total seconds a compare request waits for all of its movies together (not
+# per movie): every fetch starts at once, and whatever is not back by then is
+# shown as still loading.
+COMPARE_TIMEOUT = 20
+COMPARE_EXECUTOR = ThreadPoolExecutor(max_workers=8, thread_name_prefix="compare")
+
+
+def _fetch_scored(slug: str, max_reviews: int):
+    return get_cached_reviews(slug, max_reviews, lambda: refresh_reviews(slug, max_reviews))
+
+
+def _summarize_movies(names, rows_by_name):
+    """Label counts of the fetched reviews and top reviews for every movie."""
+    out = {}
+    with metrics.stage('aggregate'):
+        for name in names:
+            rows = rows_by_name.get(name)
+            if rows:
+                out[name] = {'summary': _label_counts(rows), 'results': rows[:10]}
+    return out
 
 
 @app.route('/compare', methods=['GET', 'POST'])
 @login_required
 def compare():
-    left_name = ''
-    right_name = ''
-    left = { 'summary': None, 'results': None }
-    right = { 'summary': None, 'results': None }
+    names = []
+    movies = []
     if request.method == 'POST':
-        left_name = request.form.get('left_movie', '').strip()
-        right_name = request.form.get('right_movie', '').strip()
+        raw = request.form.getlist('movie') + [request.form.get('left_movie', ''), request.form.get('right_movie', '')]
+        for name in (n.strip() for n in raw):
+            if name and name not in names:
+                names.append(name)
+        names = names[:MAX_COMPARE_MOVIES]
         max_reviews = request.form.get('max_reviews', '').strip()
         try:
             max_reviews = int(max_reviews) if max_reviews else 10
         except ValueError:
             max_reviews = 10
         max_reviews = min(max(max_reviews, 1), 50)
-        if left_name:
-            l_slug = name_to_slug(left_name)
-            try:
-                l_texts = get_cached_reviews(l_slug, max_reviews, lambda: get_reviews(l_slug, max_reviews=max_reviews, delay=1, fast=True, debug=False))
-            except Exception:
-                l_texts = []
-            if l_texts:
-                l_data = []
-                for t in l_texts:
-                    s = analyze_sentiment(t)
-                    lbl = label_sentiment(s)
-                    l_data.append({'review': t, 'score': s, 'label': lbl})
-                l_df = pd.DataFrame(l_data)
-                left['summary'] = l_df['label'].value_counts().to_dict()
-                left['results'] = l_df.head(10).to_dict(orient='records')
-        if right_name:
-            r_slug = name_to_slug(right_name)
+
+        futures = {COMPARE_EXECUTOR.submit(_fetch_scored, name_to_slug(n), max_reviews): n for n in names}
+        # One deadline for the whole request, shared by all the movies.
+        done, _ = wait(futures, timeout=COMPARE_TIMEOUT)
+        rows_by_name = {}
+        status = {}
+        for fut, n in futures.items():
+            if fut not in done:
+                # Still scraping; it keeps running and fills the cache for a retry.
+                status[n] = 'timeout'
+                continue
             try:
-                r_texts = get_cached_reviews(r_slug, max_reviews, lambda: get_reviews(r_slug, max_reviews=max_reviews, delay=1, fast=True, debug=False))
+                rows_by_name[n] = fut.result()
+                status[n] = 'ok' if rows_by_name[n] else 'empty'
             except Exception:
-                r_texts = []
-            if r_texts:
-                r_data = []
-                for t in r_texts:
-                    s = analyze_sentiment(t)
-                    lbl = label_sentiment(s)
-                    r_data.append({'review': t, 'score': s, 'label': lbl})
-                r_df = pd.DataFrame(r_data)
-                right['summary'] = r_df['label'].value_counts().to_dict()
-                right['results'] = r_df.head(10).to_dict(orient='records')
-    return render_template('compare.html', left_name=left_name, right_name=right_name, left=left, right=right)
+                status[n] = 'error'
+        summaries = _summarize_movies(names, rows_by_name)
+        for n in names:
+            entry = summaries.get(n, {'summary': None, 'results': None})
+            movies.append({'name': n, 'status': status[n], **entry})
+        if any(m['status'] == 'timeout' for m in movies):
+            flash('Some movies are still loading; compare again in a moment to include them.', 'info')
+    if not names:
+        names = ['', '']
+    return _render('compare.html', names=names, movies=movies, max_movies=MAX_COMPARE_MOVIES)
+
+
+# --- Full-text search over stored reviews (no scraping) ---
+SEARCH_PAGE_SIZE = 20
+
+
+def _search_args():
+    movie_name = (request.args.get('movie') or '').strip()
+    label = request.args.get('label') or None
+    try:
+        limit = int(request.args.get('limit') or SEARCH_PAGE_SIZE)
+    except ValueError:
+        limit = SEARCH_PAGE_SIZE
+    return {
+        'query': (request.args.get('q') or '').strip(),
+        'slug': name_to_slug(movie_name) if movie_name else None,
+        'label': label,
+        'sort': request.args.get('sort') or 'rank',
+        'limit': limit,
+        'cursor': request.args.get('cursor') or None,
+    }
+
+
+@app.route('/search')
+@login_required
+def search():
+    args = _search_args()
+    results, next_cursor = None, None
+    if args['query']:
+        conn = get_db()
+        init_store(conn)
+        try:
+            results, next_cursor = search_reviews(conn, **args)
+        except (ValueError, sqlite3.OperationalError) as e:
+            flash(f'Invalid search: {e}', 'warning')
+    return _render(
+        'search.html', q=args['query'], movie=request.args.get('movie', ''), label=args['label'] or '',
+        sort=args['sort'], labels=LABELS, sorts=SORTS, results=results, next_cursor=next_cursor,
+    )
 
 
+@app.route('/api/search')
+@login_required
+def api_search():
+    args = _search_args()
+    conn = get_db()
+    init_store(conn)
+    try:
+        results, next_cursor = search_reviews(conn, **args)
+    except (ValueError, sqlite3.OperationalError) as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'results': results, 'next_cursor': next_cursor})
+
+
+# --- Background scrape jobs (JSON API) ---
+@app.route('/api/jobs', methods=['POST'])
+@login_required
+def api_submit_job():
+    payload = request.get_json(silent=True) or request.form
+    movie_name = (payload.get('movie') or '').strip()
+    try:
+        max_reviews = int(payload.get('max_reviews') or 10)
+    except (TypeError, ValueError):
+        max_reviews = 10
+    max_reviews = min(max(max_reviews, 1), 50)
+    if not movie_name:
+        return jsonify({'error': 'movie is required'}), 400
+    slug = name_to_slug(movie_name)
+    job_id = submit_job(slug, max_reviews, lambda s, n: get_cached_reviews(s, n, lambda: refresh_reviews(s, n)))
+    return jsonify({
+        'job_id': job_id,
+        'status_url': url_for('api_job_status', job_id=job_id),
+        'result_url': url_for('api_job_result', job_id=job_id),
+    }), 202
+
+
+@app.route('/api/terms')
+@login_required
+def api_top_terms():
+    """Most frequent words (n=1) or word pairs (n=2) of one movie, or of all movies."""
+    movie_name = (request.args.get('movie') or '').strip()
+    try:
+        n = 2 if int(request.args.get('n') or 1) == 2 else 1
+        limit = min(max(int(request.args.get('limit') or 50), 1), 500)
+    except (TypeError, ValueError):
+        return jsonify({'error': 'n and limit must be integers'}), 400
+    slug = name_to_slug(movie_name) if movie_name else None
+    conn = get_db()
+    init_store(conn)
+    terms = top_terms(conn, slug, n=n, limit=limit)
+    return jsonify({'slug': slug, 'n': n, 'terms': [{'term': t, 'count': c} for t, c in terms]})
+
+
+@app.route('/api/jobs/<job_id>')
+@login_required
+def api_job_status(job_id):
+    job = get_job(job_id)
+    if not job:
+        return jsonify({'error': 'unknown job'}), 404
+    return jsonify(job)
+
+
+@app.route('/api/jobs/<job_id>/result')
+@login_required
+def api_job_result(job_id):
+    job, rows = job_result(job_id)
+    if not job:
+        return jsonify({'error': 'unknown job'}), 404
+    if rows is None:
+        return jsonify({'job': job}), 202
+    # summary counts the job's reviews; stats covers every stored review.
+    stats = movie_summary(get_db(), job['slug'])
+    return jsonify({
+        'job': job,
+        'summary': _label_counts(rows),
+        'stats': stats,
+        'results': rows[:10],
+    })
+
+
+# --- Prometheus metrics ---
+# Set METRICS_TOKEN to require "Authorization: Bearer <token>" on /metrics.
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+
+@app.route('/metrics')
+def prometheus_metrics():
+    if METRICS_TOKEN and request.headers.get('Authorization', '') != f'Bearer {METRICS_TOKEN}':
+        return Response('unauthorized\n', status=401, mimetype='text/plain')
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,224 @@
+import time
+
+import metrics
+from aggregates import init_aggregates, remove_movie_stats
+from db import get_db, init_once
+from main import label_sentiment
+from scheduler import HostUnavailable
+from scraper import get_reviews, iter_reviews
+from search import init_search, remove_movie_index
+from sentiment import analyze_sentiment, analyze_sentiment_batch
+from terms import content_hash, doc_terms, index_terms, init_terms, remove_terms
+
+# How long stored reviews for a movie are served before we check Letterboxd
+# for newly added ones.
+REFRESH_TTL = 600
+
+
+def init_store(conn):
+    """Create the review store's tables, indexes and triggers; runs once per connection."""
+    init_once(conn, _create_store)
+
+
+def _create_store(conn):
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS reviews (
+            slug TEXT NOT NULL,
+            content_hash TEXT NOT NULL,
+            review TEXT NOT NULL,
+            score REAL NOT NULL,
+            label TEXT NOT NULL,
+            scraped_at REAL NOT NULL,
+            PRIMARY KEY (slug, content_hash)
+        )
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS review_refresh (
+            slug TEXT PRIMARY KEY,
+            refreshed_at REAL NOT NULL,
+            complete INTEGER NOT NULL DEFAULT 0
+        )
+        """
+    )
+    # complete: the last full scrape found fewer reviews than it asked for,
+    # i.e. the store held all of them at refreshed_at.
+    columns = {r[1] for r in conn.execute('PRAGMA table_info(review_refresh)')}
+    if 'complete' not in columns:
+        conn.execute('ALTER TABLE review_refresh ADD COLUMN complete INTEGER NOT NULL DEFAULT 0')
+    init_terms(conn)
+    init_search(conn)
+    init_aggregates(conn)
+
+
+def known_hashes(conn, slug: str) -> set:
+    rows = conn.execute('SELECT content_hash FROM reviews WHERE slug = ?', (slug,)).fetchall()
+    return {r['content_hash'] for r in rows}
+
+
+def add_scored(conn, slug: str, scored, scraped_at=None, label=label_sentiment) -> int:
+    """Insert already-scored (text, score) pairs that are not stored yet. Returns the number added.
+
+    label(score) gives the stored label (the web app's thresholds by default).
+    """
+    scraped_at = time.time() if scraped_at is None else scraped_at
+    rows = [(slug, content_hash(t), t, float(s), label(float(s)), scraped_at) for t, s in scored]
+    with conn:
+        cur = conn.executemany(
+            'INSERT OR IGNORE INTO reviews (slug, content_hash, review, score, label, scraped_at) VALUES (?, ?, ?, ?, ?, ?)',
+            rows,
+        )
+    return cur.rowcount
+
+
+def remove_movie(conn, slug: str) -> None:
+    """Delete every stored review of slug, with its aggregates and term counts."""
+    with conn:
+        remove_movie_stats(conn, slug)
+        remove_movie_index(conn, slug)
+        conn.execute('DELETE FROM reviews WHERE slug = ?', (slug,))
+    remove_terms(conn, slug)
+
+
+def add_reviews(conn, slug: str, texts, scraped_at=None) -> int:
+    """Score, insert and term-index reviews that are not stored yet. Returns the number added."""
+    known = known_hashes(conn, slug)
+    fresh = {}
+    for t in texts:
+        h = content_hash(t)
+        if h not in known and h not in fresh:
+            fresh[h] = t
+    if not fresh:
+        return 0
+    with metrics.stage('score'):
+        scores = analyze_sentiment_batch(fresh.values())
+    with metrics.stage('aggregate'):
+        added = add_scored(conn, slug, zip(fresh.values(), scores), scraped_at)
+        index_terms(conn, slug, doc_terms(fresh.values()))
+    return added
+
+
+def load_reviews(conn, slug: str, limit=None):
+    # Newest scrape first; within one scrape keep Letterboxd's page order.
+    sql = 'SELECT review, score, label FROM reviews WHERE slug = ? ORDER BY scraped_at DESC, rowid ASC'
+    params = [slug]
+    if limit is not None:
+        sql += ' LIMIT ?'
+        params.append(int(limit))
+    rows = conn.execute(sql, params).fetchall()
+    return [{'review': r['review'], 'score': r['score'], 'label': r['label']} for r in rows]
+
+
+def _last_refresh(conn, slug: str):
+    """(refreshed_at, complete) of slug's last scrape, or (None, False)."""
+    row = conn.execute('SELECT refreshed_at, complete FROM review_refresh WHERE slug = ?', (slug,)).fetchone()
+    return (row['refreshed_at'], bool(row['complete'])) if row else (None, False)
+
+
+def _mark_refreshed(conn, slug: str, ts: float, complete=None) -> None:
+    # complete=None (a newest-first top-up) keeps what the last full scrape found.
+    with conn:
+        conn.execute(
+            'INSERT INTO review_refresh(slug, refreshed_at, complete) VALUES(?, ?, ?) '
+            'ON CONFLICT(slug) DO UPDATE SET refreshed_at=excluded.refreshed_at, '
+            'complete=CASE WHEN ? IS NULL THEN complete ELSE excluded.complete END',
+            (slug, ts, int(bool(complete)), complete),
+        )
+
+
+def _needs_scrape(known, max_reviews, last, complete, now, max_age):
+    """'full', 'newest' or None: how to refresh a movie with `known` stored reviews.
+
+    A movie with fewer stored reviews than requested gets a full scrape,
+    unless the last full scrape (within max_age) found that there are no
+    more; otherwise, once max_age has passed, only the newest are fetched.
+    """
+    fresh = last is not None and now - last < max_age
+    if len(known) < max_reviews and not (complete and fresh):
+        return 'full'
+    if not fresh:
+        return 'newest'
+    return None
+
+
+def refresh_reviews(slug: str, max_reviews: int, fetch_fn=get_reviews, max_age=REFRESH_TTL):
+    """Return up to max_reviews scored reviews for slug, scraping only what is missing.
+
+    A movie with fewer stored reviews than requested gets a full scrape,
+    unless one within max_age found it has no more. Otherwise, once max_age
+    has passed, only the newest reviews are fetched and the scrape stops at
+    the first review already in the store. While
+    Letterboxd's circuit breaker is open, whatever is stored is served stale
+    (HostUnavailable is raised only when nothing is).
+    """
+    conn = get_db()
+    init_store(conn)
+    now = time.time()
+    known = known_hashes(conn, slug)
+    scrape = _needs_scrape(known, max_reviews, *_last_refresh(conn, slug), now, max_age)
+    try:
+        if scrape == 'full':
+            texts = fetch_fn(slug, max_reviews=max_reviews, delay=1, fast=True, debug=False)
+            add_reviews(conn, slug, texts, scraped_at=now)
+            _mark_refreshed(conn, slug, now, complete=len(set(texts)) < max_reviews)
+        elif scrape == 'newest':
+            texts = fetch_fn(
+                slug, max_reviews=max_reviews, delay=1, fast=True, debug=False,
+                newest=True, stop_at=lambda t: content_hash(t) in known,
+            )
+            add_reviews(conn, slug, texts, scraped_at=now)
+            _mark_refreshed(conn, slug, now)
+    except HostUnavailable:
+        if not known:
+            raise
+    return load_reviews(conn, slug, limit=max_reviews)
+
+
+def stream_reviews(slug: str, max_reviews: int, iter_fn=iter_reviews, max_age=REFRESH_TTL):
+    """refresh_reviews as a generator of the same scored rows, for streaming responses.
+
+    Reviews that need scraping are scored and yielded one at a time as the
+    scraper produces them, and stored once it stops (also when the consumer
+    goes away early); the rest of the max_reviews are then read from the
+    store. Stored reviews are served when Letterboxd is unavailable.
+    """
+    conn = get_db()
+    init_store(conn)
+    now = time.time()
+    known = known_hashes(conn, slug)
+    scrape = _needs_scrape(known, max_reviews, *_last_refresh(conn, slug), now, max_age)
+    sent = set()
+    if scrape:
+        extra = {} if scrape == 'full' else {'newest': True, 'stop_at': lambda t: content_hash(t) in known}
+        scored = []
+        completed = False
+        try:
+            for text in iter_fn(slug, max_reviews=max_reviews, delay=1, fast=True, debug=False, **extra):
+                h = content_hash(text)
+                if h in sent:
+                    continue
+                sent.add(h)
+                with metrics.stage('score'):
+                    score = float(analyze_sentiment(text))
+                scored.append((text, score))
+                yield {'review': text, 'score': score, 'label': label_sentiment(score)}
+            completed = True
+        except HostUnavailable:
+            if not known:
+                raise
+        finally:
+            if scored:
+                with metrics.stage('aggregate'):
+                    add_scored(conn, slug, scored, now)
+                    index_terms(conn, slug, doc_terms([t for t, _ in scored]))
+            if completed:
+                _mark_refreshed(conn, slug, now, complete=len(sent) < max_reviews if scrape == 'full' else None)
+    for row in load_reviews(conn, slug, limit=max_reviews):
+        if len(sent) >= max_reviews:
+            break
+        h = content_hash(row['review'])
+        if h not in sent:
+            sent.add(h)
+            yield row
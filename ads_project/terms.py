@@ -0,0 +1,166 @@
+import hashlib
+import os
+import re
+from collections import Counter
+
+STOPWORDS = set(
+    "a an the and or but if in on to for with at by from of is are was were be been being as it its this that those these you your our we they them their i me my he she his her him what which who whom where when why how not no yes up down over under again further then once here there all any both each few more most other some such only own same so than too very can will just don don should now".split()
+)
+
+# Runs of letters, as str.isalpha() sees them. The class also admits a few
+# non-decimal numerics (superscripts, fractions); tokens containing those
+# are split again character by character so results match exactly.
+_TOKEN_RE = re.compile(r'[^\W\d_]+')
+# Text whose letters are all ASCII (most reviews, emoji and curly quotes
+# aside) skips the regex: map every non-letter byte to a space and split.
+_NON_ASCII = re.compile(r'[^\x00-\x7f]+')
+_ASCII_LETTERS = bytes.maketrans(
+    bytes(range(128)), bytes(c if chr(c).isalpha() else 32 for c in range(128))
+)
+
+# Index adjacent-token pairs ("dark knight") next to single words.
+INDEX_BIGRAMS = os.environ.get('TERM_INDEX_BIGRAMS', '1') == '1'
+
+
+def _split_alpha(token):
+    word = []
+    for ch in token:
+        if ch.isalpha():
+            word.append(ch)
+        elif word:
+            yield ''.join(word)
+            word = []
+    if word:
+        yield ''.join(word)
+
+
+def tokenize(text: str):
+    """Lowercased alphabetic words longer than two letters, minus STOPWORDS."""
+    if not text.isascii() and not any(ch.isalpha() for ch in ''.join(_NON_ASCII.findall(text))):
+        text = _NON_ASCII.sub(' ', text)
+    if text.isascii():
+        words = text.encode('ascii').translate(_ASCII_LETTERS).lower().decode('ascii').split()
+        return [t for t in words if len(t) > 2 and t not in STOPWORDS]
+    tokens = []
+    for tok in _TOKEN_RE.findall(text.lower()):
+        if tok.isalpha():
+            tokens.append(tok)
+        else:
+            tokens.extend(_split_alpha(tok))
+    return [t for t in tokens if len(t) > 2 and t not in STOPWORDS]
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def term_counts(text: str, bigrams=INDEX_BIGRAMS) -> Counter:
+    """Counts keyed by (n, term); bigrams are space-joined token pairs."""
+    tokens = tokenize(text)
+    counts = Counter((1, t) for t in tokens)
+    if bigrams:
+        counts.update((2, f'{a} {b}') for a, b in zip(tokens, tokens[1:]))
+    return counts
+
+
+def doc_terms(texts, bigrams=INDEX_BIGRAMS):
+    """[(content_hash, term_counts)] for texts, ready for index_terms."""
+    return [(content_hash(t), term_counts(t, bigrams)) for t in texts]
+
+
+# --- Persistent per-movie term index ---
+
+def init_terms(conn):
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS term_counts (
+            slug TEXT NOT NULL,
+            n INTEGER NOT NULL,
+            term TEXT NOT NULL,
+            count INTEGER NOT NULL,
+            UNIQUE (slug, n, term)
+        )
+        """
+    )
+    # Serves "top terms of a movie" straight from the index; ties fall back to
+    # rowid, i.e. the order terms were first seen.
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_term_counts_rank ON term_counts(slug, n, count DESC)')
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS term_totals (
+            n INTEGER NOT NULL,
+            term TEXT NOT NULL,
+            count INTEGER NOT NULL,
+            UNIQUE (n, term)
+        )
+        """
+    )
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_term_totals_rank ON term_totals(n, count DESC)')
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS term_docs (
+            slug TEXT NOT NULL,
+            content_hash TEXT NOT NULL,
+            PRIMARY KEY (slug, content_hash)
+        ) WITHOUT ROWID
+        """
+    )
+
+
+def index_terms(conn, slug: str, docs) -> int:
+    """Add the counts of reviews not indexed yet for slug. Returns how many were added.
+
+    docs is [(content_hash, Counter keyed by (n, term))], see doc_terms.
+    """
+    seen = {r[0] for r in conn.execute('SELECT content_hash FROM term_docs WHERE slug = ?', (slug,))}
+    fresh = []
+    counts = Counter()
+    for h, terms in docs:
+        if h not in seen:
+            seen.add(h)
+            fresh.append((slug, h))
+            counts.update(terms)
+    if not fresh:
+        return 0
+    with conn:
+        conn.executemany('INSERT OR IGNORE INTO term_docs (slug, content_hash) VALUES (?, ?)', fresh)
+        conn.executemany(
+            'INSERT INTO term_counts (slug, n, term, count) VALUES (?, ?, ?, ?) '
+            'ON CONFLICT(slug, n, term) DO UPDATE SET count = count + excluded.count',
+            ((slug, n, term, c) for (n, term), c in counts.items()),
+        )
+        conn.executemany(
+            'INSERT INTO term_totals (n, term, count) VALUES (?, ?, ?) '
+            'ON CONFLICT(n, term) DO UPDATE SET count = count + excluded.count',
+            ((n, term, c) for (n, term), c in counts.items()),
+        )
+    return len(fresh)
+
+
+def remove_terms(conn, slug: str) -> None:
+    """Drop slug's reviews from the index, taking its counts back out of the totals."""
+    with conn:
+        conn.execute(
+            'UPDATE term_totals SET count = count - ('
+            'SELECT c.count FROM term_counts c WHERE c.slug = ? AND c.n = term_totals.n AND c.term = term_totals.term'
+            ') WHERE (n, term) IN (SELECT n, term FROM term_counts WHERE slug = ?)',
+            (slug, slug),
+        )
+        conn.execute('DELETE FROM term_totals WHERE count <= 0')
+        conn.execute('DELETE FROM term_counts WHERE slug = ?', (slug,))
+        conn.execute('DELETE FROM term_docs WHERE slug = ?', (slug,))
+
+
+def top_terms(conn, slug=None, n=1, limit=200):
+    """[(term, count)] most frequent first, for one movie or (slug=None) all movies."""
+    if slug is None:
+        rows = conn.execute(
+            'SELECT term, count FROM term_totals WHERE n = ? ORDER BY count DESC, rowid ASC LIMIT ?',
+            (n, int(limit)),
+        )
+    else:
+        rows = conn.execute(
+            'SELECT term, count FROM term_counts WHERE slug = ? AND n = ? ORDER BY count DESC, rowid ASC LIMIT ?',
+            (slug, n, int(limit)),
+        )
+    return [(r[0], r[1]) for r in rows]
@@ -0,0 +1,36 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+import archive
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _import_archive(mode):
+    env = dict(os.environ, SCRAPER_ARCHIVE_MODE=mode)
+    return subprocess.run(
+        [sys.executable, '-c', 'import archive; print(archive._mode)'],
+        cwd=APP_DIR, env=env, capture_output=True, text=True,
+    )
+
+
+@pytest.mark.parametrize('mode, expected', [('', 'None'), ('record', 'record'), ('replay', 'replay')])
+def test_env_mode_accepted(mode, expected):
+    result = _import_archive(mode)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == expected
+
+
+@pytest.mark.parametrize('mode', ['replay ', 'Record', 'live'])
+def test_env_mode_rejected(mode):
+    result = _import_archive(mode)
+    assert result.returncode != 0
+    assert 'SCRAPER_ARCHIVE_MODE must be one of record, replay' in result.stderr
+
+
+def test_configure_rejects_unknown_mode():
+    with pytest.raises(ValueError):
+        archive.configure('Record')
@@ -0,0 +1,103 @@
+"""DriverPool against real headless Chrome and the local stub server.
+
+Skipped when Chrome (or selenium/chromedriver) is not available.
+"""
+import shutil
+import threading
+
+import pytest
+
+pytest.importorskip('selenium')
+
+import browser_pool  # noqa: E402
+from bench.stub_server import make_server  # noqa: E402
+
+CHROME_BINARIES = ('google-chrome', 'google-chrome-stable', 'chromium', 'chromium-browser', 'chrome')
+
+
+@pytest.fixture(scope='module')
+def chrome_factory():
+    if not any(shutil.which(name) for name in CHROME_BINARIES):
+        pytest.skip('Chrome is not installed')
+    try:
+        browser_pool._quit(browser_pool.new_chrome())
+    except Exception as e:
+        pytest.skip(f'cannot start Chrome: {e}')
+    return browser_pool.new_chrome
+
+
+@pytest.fixture(scope='module')
+def stub_url():
+    server = make_server(pages=1)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{server.server_address[1]}/film/stub/reviews/'
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def pool(chrome_factory):
+    created = []
+
+    def factory():
+        driver = chrome_factory()
+        created.append(driver)
+        return driver
+
+    pool = browser_pool.DriverPool(size=1, idle_timeout=300, factory=factory)
+    pool.created = created
+    yield pool
+    pool.close()
+
+
+def test_driver_is_reused(pool, stub_url):
+    with pool.driver() as first:
+        first.get(stub_url)
+    with pool.driver() as second:
+        second.get(stub_url)
+        assert 'review' in second.page_source
+    assert second is first
+    assert len(pool.created) == 1
+    assert pool.idle_count() == 1
+
+
+_STORAGE_JS = 'return [window.localStorage.length, window.sessionStorage.length];'
+_FILL_STORAGE_JS = 'window.localStorage.setItem("k", "v"); window.sessionStorage.setItem("k", "v");'
+
+
+def test_driver_is_reset_between_checkouts(pool, stub_url):
+    # Same server under a second host name: a separate cookie domain and origin.
+    other_url = stub_url.replace('127.0.0.1', 'localhost')
+    with pool.driver() as driver:
+        driver.get(stub_url)
+        driver.add_cookie({'name': 'session', 'value': 'used'})
+        driver.execute_script(_FILL_STORAGE_JS)
+        driver.execute_script('window.open("about:blank");')
+        assert len(driver.window_handles) == 2
+        driver.switch_to.window(driver.window_handles[1])
+        driver.get(other_url)
+        driver.add_cookie({'name': 'other', 'value': 'used'})
+        driver.execute_script(_FILL_STORAGE_JS)
+        driver.switch_to.window(driver.window_handles[0])
+    with pool.driver() as driver:
+        assert len(driver.window_handles) == 1
+        assert driver.current_url == 'about:blank'
+        for url in (stub_url, other_url):
+            driver.get(url)
+            assert driver.get_cookies() == []
+            assert driver.execute_script(_STORAGE_JS) == [0, 0]
+    assert len(pool.created) == 1
+
+
+def test_crashed_driver_is_replaced(pool, stub_url):
+    with pool.driver() as driver:
+        driver.get(stub_url)
+        # A dead browser: reset fails on release and the pool drops it.
+        driver.quit()
+    assert pool.idle_count() == 0
+    with pool.driver() as replacement:
+        replacement.get(stub_url)
+        assert 'review' in replacement.page_source
+    assert replacement is not driver
+    assert len(pool.created) == 2
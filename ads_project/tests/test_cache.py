@@ -0,0 +1,222 @@
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+from cache import MemoryBackend, ReviewCache, SQLiteBackend
+from db import connect
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# One worker process: looks up 'movie' in the shared cache, its fetch is slow
+# and leaves a line in the log file, then prints what it got.
+WORKER = """
+import sys, time
+from cache import ReviewCache, SQLiteBackend
+
+path, log = sys.argv[1], sys.argv[2]
+
+def fetch():
+    with open(log, 'a') as f:
+        f.write('fetch\\n')
+    time.sleep(1)
+    return ['first review', 'second review']
+
+cache = ReviewCache(backend=SQLiteBackend(path, poll=0.01), lock_timeout=10)
+print(','.join(cache.get('movie', 2, fetch)))
+"""
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def backend(request, tmp_path):
+    if request.param == 'memory':
+        return MemoryBackend()
+    return SQLiteBackend(str(tmp_path / 'cache.db'))
+
+
+def test_larger_entry_answers_smaller_requests(backend):
+    cache = ReviewCache(backend=backend)
+    calls = []
+
+    def fetch(n):
+        def run():
+            calls.append(n)
+            return [f'review {i}' for i in range(n)]
+        return run
+
+    assert cache.get('movie', 5, fetch(5)) == [f'review {i}' for i in range(5)]
+    assert cache.get('movie', 3, fetch(3)) == ['review 0', 'review 1', 'review 2']
+    assert calls == [5]
+    # A full entry cannot answer a larger request.
+    cache.get('movie', 8, fetch(8))
+    assert calls == [5, 8]
+
+
+def test_short_entry_answers_larger_requests(backend):
+    cache = ReviewCache(backend=backend)
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        return ['only review']
+
+    cache.get('movie', 5, fetch)
+    assert cache.get('movie', 50, fetch) == ['only review']
+    assert len(calls) == 1
+
+
+def test_negative_ttl(backend):
+    clock = Clock()
+    cache = ReviewCache(ttl=600, negative_ttl=60, clock=clock, backend=backend)
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        return []
+
+    assert cache.get('movie', 5, fetch) == []
+    clock.now += 59
+    assert cache.get('movie', 5, fetch) == []
+    assert len(calls) == 1
+    clock.now += 1
+    cache.get('movie', 5, fetch)
+    assert len(calls) == 2
+
+
+def test_failed_fetch_is_remembered(backend):
+    clock = Clock()
+    cache = ReviewCache(negative_ttl=60, clock=clock, backend=backend)
+
+    def fail():
+        raise RuntimeError('scrape failed')
+
+    with pytest.raises(RuntimeError):
+        cache.get('movie', 5, fail)
+    assert cache.get('movie', 5, fail) == []
+    assert cache.stats()['misses'] == 1
+
+
+def test_threads_share_one_fetch(backend):
+    cache = ReviewCache(backend=backend)
+    calls = []
+    started = threading.Event()
+
+    def fetch():
+        calls.append(1)
+        started.set()
+        time.sleep(0.2)
+        return ['a review']
+
+    results = []
+
+    def worker():
+        results.append(cache.get('movie', 5, fetch))
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    threads[0].start()
+    started.wait(5)
+    for t in threads[1:]:
+        t.start()
+    for t in threads:
+        t.join(10)
+    assert len(calls) == 1
+    assert results == [['a review']] * 8
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses']) == (7, 1)
+
+
+def test_lease_blocks_other_holders_until_released(tmp_path):
+    path = str(tmp_path / 'cache.db')
+    a = SQLiteBackend(path, poll=0.01)
+    b = SQLiteBackend(path, poll=0.01)
+    token = a.acquire('movie', 0)
+    assert token is not None
+    assert b.acquire('movie', 0.05) is None
+    # Leases are per slug.
+    assert b.acquire('other', 0) is not None
+    a.release('movie', token)
+    assert b.acquire('movie', 0) is not None
+
+
+def test_lease_expires_after_a_crash(tmp_path):
+    path = str(tmp_path / 'cache.db')
+    crashed = SQLiteBackend(path, lease=0.1, poll=0.01)
+    assert crashed.acquire('movie', 0) is not None
+    other = SQLiteBackend(path, poll=0.01)
+    assert other.acquire('movie', 0) is None
+    assert other.acquire('movie', 2) is not None
+
+
+def test_stale_release_keeps_new_lease(tmp_path):
+    path = str(tmp_path / 'cache.db')
+    a = SQLiteBackend(path, lease=0.05, poll=0.01)
+    b = SQLiteBackend(path, poll=0.01)
+    old = a.acquire('movie', 0)
+    assert b.acquire('movie', 2) is not None
+    # The expired holder releasing late must not free b's lease.
+    a.release('movie', old)
+    assert a.acquire('movie', 0) is None
+
+
+def _last_access(path, slug):
+    conn = connect(path)
+    try:
+        return conn.execute('SELECT last_access FROM review_cache WHERE slug = ?', (slug,)).fetchone()[0]
+    finally:
+        conn.close()
+
+
+@pytest.mark.parametrize('touch_interval, touched', [(30, False), (0, True)])
+def test_touch_interval(tmp_path, touch_interval, touched):
+    path = str(tmp_path / 'cache.db')
+    backend = SQLiteBackend(path, touch_interval=touch_interval)
+    backend.put('movie', {'ts': 0, 'max_reviews': 1, 'data': ['a review']}, 10)
+    before = _last_access(path, 'movie')
+    time.sleep(0.01)
+    assert backend.get('movie')['data'] == ['a review']
+    assert (_last_access(path, 'movie') > before) is touched
+
+
+def test_touch_keeps_hot_entry_from_eviction(tmp_path):
+    backend = SQLiteBackend(str(tmp_path / 'cache.db'), touch_interval=0)
+    cache = ReviewCache(maxsize=2, backend=backend)
+    cache.get('a', 1, lambda: ['a'])
+    time.sleep(0.01)
+    cache.get('b', 1, lambda: ['b'])
+    time.sleep(0.01)
+    cache.get('a', 1, lambda: ['refetched'])
+    time.sleep(0.01)
+    cache.get('c', 1, lambda: ['c'])
+    assert backend.get('b') is None
+    assert backend.get('a')['data'] == ['a']
+    assert cache.stats()['evictions'] == 1
+
+
+def test_processes_share_one_fetch(tmp_path):
+    path = str(tmp_path / 'cache.db')
+    log = tmp_path / 'fetches.log'
+    # Create the tables up front so the workers do not race on the schema.
+    SQLiteBackend(path)
+    procs = [
+        subprocess.Popen(
+            [sys.executable, '-c', WORKER, path, str(log)],
+            cwd=APP_DIR, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+        )
+        for _ in range(3)
+    ]
+    outputs = [p.communicate(timeout=30) for p in procs]
+    for p, (out, err) in zip(procs, outputs):
+        assert p.returncode == 0, err
+        assert out.strip() == 'first review,second review'
+    assert log.read_text().splitlines() == ['fetch']
@@ -0,0 +1,148 @@
+import csv
+import os
+from collections import Counter
+
+import pytest
+
+import export_powerbi
+from aggregates import movie_summary
+from store import known_hashes
+from terms import content_hash
+
+
+@pytest.mark.parametrize('processes', [0, 2])
+def test_pipeline_bounds_movies_in_flight(monkeypatch, processes):
+    def scrape(movie, slug, max_reviews):
+        return [f'{movie} was great', f'{movie} was dull'], 'success', '', {'fetch': 0.0, 'parse': 0.0}
+
+    monkeypatch.setattr(export_powerbi, '_scrape', scrape)
+    movies = [f'Movie {i}' for i in range(200)]
+    pulled = [0]
+
+    def feed():
+        # Counts the movies the pipeline has taken on.
+        for movie in movies:
+            pulled[0] += 1
+            yield movie
+
+    window = 6
+    results = export_powerbi._pipeline(feed(), 2, None, False, 'ts', 2, processes, window=window)
+    peak = 0
+    done = []
+    for movie, *_ in results:
+        done.append(movie)
+        peak = max(peak, pulled[0] - len(done))
+    assert done == movies
+    assert 0 < peak <= window
+
+
+def _read(out_dir, table):
+    with open(os.path.join(out_dir, f'{table}.csv'), encoding='utf-8', newline='') as f:
+        return list(csv.DictReader(f))
+
+
+def test_analyze_movie_scores_reviews_in_one_batch(monkeypatch):
+    batches = []
+    score = export_powerbi.analyze_sentiment_batch
+
+    def batch(texts):
+        batches.append(list(texts))
+        return score(texts)
+
+    monkeypatch.setattr(export_powerbi, 'analyze_sentiment_batch', batch)
+    texts = ['a great film', 'a dull film', 'fine']
+    rows, scored, _, _ = export_powerbi.analyze_movie('Movie', 'movie', 'Drama', texts, 'ts', False)
+    assert batches == [texts]
+    assert [t for t, _ in scored] == texts
+    assert all(type(s) is float for _, s in scored)
+    assert [r['sentiment_label'] for r in rows] == [export_powerbi.label_sentiment(s) for _, s in scored]
+
+
+def test_words_come_from_the_store_of_exported_reviews(monkeypatch, tmp_path):
+    runs = [
+        ['a gripping thriller', 'a gripping finale', 'a gripping thriller'],
+        # 0.1 scores Positive in the export but Neutral in the web app.
+        ['a dull thriller', 'pacing is fine but sleepy'],
+    ]
+    for texts in runs:
+        monkeypatch.setattr(export_powerbi, 'get_reviews', lambda slug, **kw: list(texts))
+        export_powerbi.export_powerbi(['Movie'], out_dir=str(tmp_path), processes=0)
+
+    # The second export replaced the first one's reviews in the store.
+    assert [r['review'] for r in _read(tmp_path, 'reviews')] == runs[1]
+    words = {r['word']: int(r['count']) for r in _read(tmp_path, 'words')}
+    assert words == {'dull': 1, 'thriller': 1, 'pacing': 1, 'fine': 1, 'sleepy': 1}
+    conn = export_powerbi.open_store(str(tmp_path))
+    try:
+        assert known_hashes(conn, 'movie') == {content_hash(t) for t in runs[1]}
+        summary = movie_summary(conn, 'movie')
+    finally:
+        conn.close()
+    # movies.csv is the store's aggregate, labelled as in reviews.csv.
+    reviews = _read(tmp_path, 'reviews')
+    [movie] = _read(tmp_path, 'movies')
+    assert int(movie['total_reviews']) == summary['total'] == len(reviews)
+    assert summary['labels'] == dict(Counter(r['sentiment_label'] for r in reviews))
+
+
+def test_incremental_analyses_only_new_reviews(monkeypatch, tmp_path):
+    scraped = ['a gripping thriller', 'pacing is fine but sleepy']
+    monkeypatch.setattr(export_powerbi, 'get_reviews', lambda slug, **kw: list(scraped))
+    export_powerbi.export_powerbi(['Movie'], out_dir=str(tmp_path), processes=0)
+    first = _read(tmp_path, 'reviews')
+
+    analysed = []
+    analyze_movie = export_powerbi.analyze_movie
+
+    def spy(movie, slug, genre, texts, ts, manual):
+        analysed.extend(texts)
+        return analyze_movie(movie, slug, genre, texts, ts, manual)
+
+    monkeypatch.setattr(export_powerbi, 'analyze_movie', spy)
+    scraped = ['a dull finale', 'a gripping thriller']
+    export_powerbi.export_powerbi(['Movie'], out_dir=str(tmp_path), processes=0, incremental=True, stale_after_hours=0)
+
+    assert analysed == ['a dull finale']
+    reviews = _read(tmp_path, 'reviews')
+    assert reviews[:2] == first
+    assert [r['review'] for r in reviews] == ['a gripping thriller', 'pacing is fine but sleepy', 'a dull finale']
+    words = {r['word']: int(r['count']) for r in _read(tmp_path, 'words')}
+    assert words == {'gripping': 1, 'thriller': 1, 'pacing': 1, 'fine': 1, 'sleepy': 1, 'dull': 1, 'finale': 1}
+    [movie] = _read(tmp_path, 'movies')
+    assert int(movie['total_reviews']) == 3
+
+
+@pytest.mark.parametrize('crash_at', ['rename', 'clear'])
+def test_incremental_resumes_after_crash_while_finishing(monkeypatch, tmp_path, crash_at):
+    scraped = ['a gripping thriller']
+    monkeypatch.setattr(export_powerbi, 'get_reviews', lambda slug, **kw: list(scraped))
+    export_powerbi.export_powerbi(['Movie', 'Other'], out_dir=str(tmp_path), processes=0)
+    scraped = ['a dull finale']
+
+    replace = os.replace
+    renamed = []
+
+    def crash_rename(src, dst):
+        # Dies after moving the first partial file into place.
+        if src.endswith('.partial'):
+            if renamed:
+                raise RuntimeError('crash')
+            renamed.append(src)
+        replace(src, dst)
+
+    def crash_clear(checkpoint):
+        raise RuntimeError('crash')
+
+    with monkeypatch.context() as m:
+        if crash_at == 'rename':
+            m.setattr(os, 'replace', crash_rename)
+        else:
+            m.setattr(export_powerbi._Checkpoint, 'clear', crash_clear)
+        with pytest.raises(RuntimeError):
+            export_powerbi.export_powerbi(['Movie'], out_dir=str(tmp_path), processes=0, incremental=True, stale_after_hours=0)
+
+    export_powerbi.export_powerbi(['Movie'], out_dir=str(tmp_path), processes=0, incremental=True, stale_after_hours=0)
+    reviews = [(r['slug'], r['review']) for r in _read(tmp_path, 'reviews')]
+    assert reviews == [('movie', 'a gripping thriller'), ('movie', 'a dull finale'), ('other', 'a gripping thriller')]
+    assert not os.path.exists(tmp_path / export_powerbi.CHECKPOINT_FILE)
+    assert not any(name.endswith('.partial') for name in os.listdir(tmp_path))
@@ -0,0 +1,61 @@
+import time
+
+import http_client
+
+
+class FakeResponse:
+    def __init__(self, status_code, text='', headers=None):
+        self.status_code = status_code
+        self.text = text
+        self.headers = headers or {}
+
+
+class FakeSession:
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.requests = []
+
+    def get(self, url, headers=None, timeout=None):
+        self.requests.append(dict(headers or {}))
+        return self.responses.pop(0)
+
+
+def _setup(monkeypatch, tmp_path, *responses):
+    session = FakeSession(*responses)
+    monkeypatch.setattr(http_client, 'get_session', lambda: session)
+    return session, http_client.ResponseCache(str(tmp_path))
+
+
+def test_304_serves_parsed_result_and_counts_as_fetched(monkeypatch, tmp_path):
+    url = 'https://cache-304.test/page'
+    session, cache = _setup(monkeypatch, tmp_path, FakeResponse(200, 'body', {'ETag': 'v1'}), FakeResponse(304))
+    parse = lambda body: [body.upper()]
+    assert http_client.cached_get(url, parse, cache=cache) == ['BODY']
+    entry = cache.get(url)
+    entry['fetched_at'] = time.time() - cache.max_age + 60
+    cache.put(url, entry)
+
+    assert http_client.cached_get(url, parse, cache=cache) == ['BODY']
+    assert session.requests[1]['If-None-Match'] == 'v1'
+    assert cache.get(url)['fetched_at'] > time.time() - 60
+
+
+def test_parser_change_reparses_cached_body(monkeypatch, tmp_path):
+    url = 'https://cache-parser.test/page'
+    session, cache = _setup(monkeypatch, tmp_path, FakeResponse(200, 'body', {'ETag': 'v1'}), FakeResponse(304))
+    parse = lambda body: ['old']
+    assert http_client.cached_get(url, parse, cache=cache) == ['old']
+
+    # Same parser, new code: the old result must not be served.
+    new_key = http_client.parser_key(parse).split('@')[0] + '@new'
+    monkeypatch.setattr(http_client, 'parser_key', lambda parse: new_key)
+    assert http_client.cached_get(url, lambda body: ['new'], cache=cache) == ['new']
+    assert list(cache.get(url)['parsed']) == [new_key]
+
+
+def test_parser_key_tracks_module_source():
+    from review_extract import extract_review_texts
+
+    key = http_client.parser_key(extract_review_texts)
+    name, version = key.split('@')
+    assert name == 'extract_review_texts' and version
@@ -0,0 +1,96 @@
+import threading
+import time
+
+import pytest
+import requests
+
+from bench.stub_server import make_server
+from scheduler import HostScheduler, HostUnavailable, TokenBucket
+
+
+class Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+def _scheduler(**kw):
+    kw.setdefault('backoff', 0.01)
+    return HostScheduler('stub.test', TokenBucket(1000, 1000), **kw)
+
+
+@pytest.fixture
+def stub():
+    servers = []
+
+    def start(**kw):
+        server = make_server(pages=1, **kw)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return server, f'http://127.0.0.1:{server.server_address[1]}/film/x/reviews/'
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def test_limit_halves_on_throttling_at_most_once_a_second():
+    clock = Clock()
+    sched = HostScheduler('stub.test', TokenBucket(1000, 1000, clock), max_concurrency=8, backoff=0.01, clock=clock)
+
+    def send(status):
+        sched.acquire()
+        sched.release(status)
+        clock.now += 0.1  # past the backoff pause
+
+    send(429)
+    assert sched.limit == 4
+    send(503)
+    assert sched.limit == 4
+    clock.now += 1.0
+    send(503)
+    assert sched.limit == 2
+    # Successes grow it back by one per `limit` of them.
+    send(200)
+    send(200)
+    assert sched.limit == pytest.approx(3.0, abs=0.2)
+
+
+def test_retry_after_pauses_the_host(stub):
+    server, url = stub(throttle_every=2, retry_after=1)
+    sched = _scheduler()
+    assert sched.request(lambda: requests.get(url, timeout=5)).status_code == 200
+    start = time.monotonic()
+    # The second request gets a 429 with Retry-After: 1 and is retried after the pause.
+    assert sched.request(lambda: requests.get(url, timeout=5)).status_code == 200
+    assert time.monotonic() - start >= 1.0
+    assert server.requests == {200: 2, 429: 1}
+
+
+def test_breaker_opens_then_recovers_through_a_half_open_probe(stub):
+    server, url = stub(outage=0.5)
+    sched = _scheduler(threshold=2, cooldown=0.6)
+    for _ in range(2):
+        assert sched.request(lambda: requests.get(url, timeout=5), retries=0).status_code == 503
+    assert sched.state() == 'open'
+    with pytest.raises(HostUnavailable) as exc:
+        sched.request(lambda: requests.get(url, timeout=5))
+    assert exc.value.reason == 'open'
+    assert server.requests == {503: 2}
+
+    time.sleep(0.7)
+    assert sched.state() == 'half-open'
+    assert sched.request(lambda: requests.get(url, timeout=5)).status_code == 200
+    assert sched.state() == 'closed'
+
+
+def test_acquire_timeout_has_its_own_reason():
+    sched = _scheduler(max_concurrency=1)
+    sched.acquire()
+    with pytest.raises(HostUnavailable) as exc:
+        sched.acquire(timeout=0.05)
+    assert exc.value.reason == 'timeout'
+    assert sched.state() == 'closed'
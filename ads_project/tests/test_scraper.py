@@ -0,0 +1,62 @@
+import threading
+
+import pytest
+
+import metrics
+import scheduler
+import scraper
+
+
+def _serve(monkeypatch, pages):
+    """Stub _fetch_page_reviews with pages(url) -> reviews; returns the fetched URLs."""
+    fetched = []
+    lock = threading.Lock()
+
+    def fetch(url):
+        with lock:
+            fetched.append(url)
+        return pages(url)
+
+    monkeypatch.setattr(scraper, '_fetch_page_reviews', fetch)
+    return fetched
+
+
+def test_fast_reviews_pages_in_waves(monkeypatch):
+    url = 'https://example.test/film/x/reviews/'
+    fetched = _serve(monkeypatch, lambda u: [f'{u} review {i}' for i in range(scraper.REVIEWS_PER_PAGE)])
+    reviews = list(scraper._fast_reviews(url, 30))
+    assert len(reviews) == 30
+    assert len(set(reviews)) == 30
+    assert len(fetched) == 3
+
+
+def test_fast_reviews_stops_when_a_wave_adds_nothing(monkeypatch):
+    # Every page repeats the same reviews, like a server that keeps
+    # answering with its last page: no wave after the first adds anything.
+    page = [f'review {i}' for i in range(scraper.REVIEWS_PER_PAGE)]
+    fetched = _serve(monkeypatch, lambda u: list(page))
+    reviews = list(scraper._fast_reviews('https://example.test/film/x/reviews/', 1000))
+    assert reviews == page
+    assert len(fetched) == 2 * scraper.MAX_PAGE_FETCHES
+
+
+def test_fast_reviews_stops_on_known_reviews(monkeypatch):
+    # Pages past the first only repeat reviews already seen.
+    first = [f'new {i}' for i in range(5)]
+    fetched = _serve(monkeypatch, lambda u: list(first) if u.endswith('/reviews/') else first[:3])
+    reviews = list(scraper._fast_reviews('https://example.test/film/x/reviews/', 500))
+    assert reviews == first
+    assert len(fetched) <= 2 * scraper.MAX_PAGE_FETCHES
+
+
+def test_failures_are_counted_by_reason_not_slug(monkeypatch, caplog):
+    def unavailable(url):
+        raise scheduler.HostUnavailable('example.test', 5)
+
+    monkeypatch.setattr(scraper, '_fetch_page_reviews', unavailable)
+    before = metrics.SCRAPE_FAILURES.value(reason='unavailable')
+    with pytest.raises(scheduler.HostUnavailable):
+        scraper.get_reviews('any-user-input', max_reviews=5)
+    assert metrics.SCRAPE_FAILURES.value(reason='unavailable') == before + 1
+    assert 'any-user-input' not in metrics.render()
+    assert 'any-user-input' in caplog.text
@@ -0,0 +1,77 @@
+import pytest
+
+import db
+import store
+
+
+@pytest.fixture
+def app_db(monkeypatch, tmp_path):
+    monkeypatch.setattr(db, 'DB_PATH', str(tmp_path / 'app.db'))
+    yield
+    db.close_db()
+
+
+class FakeScraper:
+    """Serves the reviews in `available`, newest first, counting scrapes."""
+
+    def __init__(self, available):
+        self.available = available
+        self.calls = []
+
+    def fetch(self, slug, max_reviews=10, stop_at=None, newest=False, **kw):
+        self.calls.append('newest' if newest else 'full')
+        out = []
+        for text in self.available[:max_reviews]:
+            if stop_at and stop_at(text):
+                break
+            out.append(text)
+        return out
+
+    def iter(self, *args, **kwargs):
+        yield from self.fetch(*args, **kwargs)
+
+
+@pytest.mark.parametrize('mode', ['refresh', 'stream'])
+def test_short_movie_is_not_rescraped_within_ttl(app_db, mode):
+    scraper = FakeScraper(['a great film', 'a dull film'])
+
+    def get(max_age=600):
+        if mode == 'refresh':
+            return store.refresh_reviews('movie', 10, fetch_fn=scraper.fetch, max_age=max_age)
+        return list(store.stream_reviews('movie', 10, iter_fn=scraper.iter, max_age=max_age))
+
+    assert len(get()) == 2
+    assert len(get()) == 2
+    assert scraper.calls == ['full']
+    # Once the TTL has passed it is scraped in full again.
+    scraper.available.insert(0, 'an okay film')
+    assert len(get(max_age=0)) == 3
+    assert scraper.calls == ['full', 'full']
+
+
+def test_full_movie_gets_newest_only_after_ttl(app_db):
+    scraper = FakeScraper([f'review {i}' for i in range(5)])
+    store.refresh_reviews('movie', 5, fetch_fn=scraper.fetch)
+    store.refresh_reviews('movie', 5, fetch_fn=scraper.fetch)
+    assert scraper.calls == ['full']
+    store.refresh_reviews('movie', 5, fetch_fn=scraper.fetch, max_age=0)
+    assert scraper.calls == ['full', 'newest']
+
+
+def test_init_store_runs_once_per_connection(app_db):
+    conn = db.get_db()
+    statements = []
+    conn.set_trace_callback(statements.append)
+    store.init_store(conn)
+    first = len(statements)
+    store.init_store(conn)
+    assert first > 0 and len(statements) == first
+
+
+def test_init_store_adds_complete_column_to_old_refresh_table(app_db):
+    conn = db.get_db()
+    with conn:
+        conn.execute('CREATE TABLE review_refresh (slug TEXT PRIMARY KEY, refreshed_at REAL NOT NULL)')
+        conn.execute("INSERT INTO review_refresh VALUES ('movie', 1.0)")
+    store.init_store(conn)
+    assert store._last_refresh(conn, 'movie') == (1.0, False)
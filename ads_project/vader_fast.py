@@ -0,0 +1,64 @@
+"""VADER scoring without the per-text punctuation dict.
+
+nltk's SentiText builds {punctuation + word: word} and {word + punctuation:
+word} for every word of a text and every entry of PUNC_LIST (34 entries per
+word) just to strip punctuation from the ends of tokens. That dict is about
+two thirds of polarity_scores' time. FastAnalyzer strips the tokens directly,
+skips sentiment_valence for words not in the lexicon (it scores them 0) and
+otherwise runs nltk's scoring code, so the scores are identical.
+
+Imported lazily by sentiment.get_analyzer (it pulls in nltk).
+"""
+from nltk.sentiment.vader import SentimentIntensityAnalyzer, SentiText
+
+
+class FastSentiText(SentiText):
+    def _words_and_emoticons(self):
+        # Words are split from text with punctuation removed, so they contain
+        # no punctuation: a token matches the dict's punc+word key only when
+        # its whole leading punctuation run is a PUNC_LIST entry and the rest
+        # is a word (likewise for trailing punctuation).
+        punc = set(self.PUNC_LIST)
+        chars = ''.join(set(''.join(self.PUNC_LIST)))
+        words = {w for w in self.REGEX_REMOVE_PUNCTUATION.sub('', self.text).split() if len(w) > 1}
+        out = []
+        for we in self.text.split():
+            if len(we) < 2:
+                continue
+            rest = we.lstrip(chars)
+            if rest != we:
+                if rest in words and we[:len(we) - len(rest)] in punc:
+                    we = rest
+            else:
+                head = we.rstrip(chars)
+                if head != we and head in words and we[len(head):] in punc:
+                    we = head
+            out.append(we)
+        return out
+
+
+class FastAnalyzer(SentimentIntensityAnalyzer):
+    def polarity_scores(self, text):
+        # nltk's polarity_scores with FastSentiText.
+        sentitext = FastSentiText(text, self.constants.PUNC_LIST, self.constants.REGEX_REMOVE_PUNCTUATION)
+        sentiments = []
+        words_and_emoticons = sentitext.words_and_emoticons
+        booster = self.constants.BOOSTER_DICT
+        lexicon = self.lexicon
+        first_index = {}
+        for idx, token in enumerate(words_and_emoticons):
+            first_index.setdefault(token, idx)
+        last = len(words_and_emoticons) - 1
+        for item in words_and_emoticons:
+            i = first_index[item]
+            lowered = item.lower()
+            if (i < last and lowered == 'kind' and words_and_emoticons[i + 1].lower() == 'of') or lowered in booster:
+                sentiments.append(0)
+                continue
+            if lowered not in lexicon:
+                # sentiment_valence would only append 0 for it.
+                sentiments.append(0)
+                continue
+            sentiments = self.sentiment_valence(0, sentitext, item, i, sentiments)
+        sentiments = self._but_check(words_and_emoticons, sentiments)
+        return self.score_valence(sentiments, text)